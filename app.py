@@ -3,18 +3,26 @@ from loguru import logger
 from loader import config, dp
 from database.models import connect, disconnect
 from database.redis_base import RedisClient
+from database.subscription_cache import SubscriptionCache
 from functions.task_notify import NotificationService
+from functions.notify_queue import NotificationDispatcher
 from functions.wb_api import ApiClient
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 import handlers
 from functions.executional import check_subscriptions
+from utils.metrics import registry, start_metrics_server
 
 
 async def on_startup(dispatcher: Dispatcher):
     connect()
     redis_client = RedisClient(redis_url=config.redis_url)
     await redis_client.init()
+    await redis_client.rebuild_indexes()
+    await redis_client.load_warehouse_names()
     dispatcher.bot['redis_client'] = redis_client
+    subscription_cache = SubscriptionCache(redis_client)
+    await subscription_cache.load()
+    dispatcher.bot['subscription_cache'] = subscription_cache
 
     from utils.logger_config import setup_logger
     setup_logger(level="DEBUG")
@@ -27,21 +35,49 @@ async def on_startup(dispatcher: Dispatcher):
     handlers.register_all_handlers(dispatcher)
 
     api_client = ApiClient(api_keys=config.api_key, max_retries=5, retry_delay=2, rate_limit=5)
+    await api_client.start()
+    dispatcher.bot['api_client'] = api_client
     scheduler = AsyncIOScheduler()
     notification_service = NotificationService(api_client=api_client,
                                                redis_client=redis_client,
                                                bot=dispatcher.bot,
-                                               scheduler=scheduler)
+                                               scheduler=scheduler,
+                                               subscription_cache=subscription_cache)
 
     dispatcher.bot['notification_service'] = notification_service
 
-    scheduler.add_job(check_subscriptions, 'interval', minutes=1)
+    notification_dispatcher = NotificationDispatcher(bot=dispatcher.bot, redis_client=redis_client)
+    notification_dispatcher.start()
+    dispatcher.bot['notification_dispatcher'] = notification_dispatcher
+
+    scheduler.add_job(check_subscriptions, 'interval', minutes=1, args=[redis_client, subscription_cache])
     logger.info("Scheduler job for check_subscriptions added.")
 
+    scheduler.add_job(redis_client.expire_requests, 'interval', minutes=1)
+    logger.info("Scheduler job for request expiry added.")
+
+    scheduler.add_job(redis_client.load_warehouse_names, 'interval', minutes=30)
+    logger.info("Scheduler job for warehouse directory refresh added.")
+
     notification_service.start_scheduler()
 
+    if config.metrics_port:
+        registry.add_collector(redis_client.collect_metrics)
+        dispatcher.bot['metrics_runner'] = await start_metrics_server(config.metrics_host, config.metrics_port)
+
 
 async def on_shutdown(dispatcher: Dispatcher):
+    notification_dispatcher = dispatcher.bot.get('notification_dispatcher')
+    if notification_dispatcher:
+        await notification_dispatcher.stop()
+
+    api_client = dispatcher.bot.get('api_client')
+    if api_client:
+        await api_client.close()
+
+    metrics_runner = dispatcher.bot.get('metrics_runner')
+    if metrics_runner:
+        await metrics_runner.cleanup()
     disconnect()
     logger.info('Bot Stopped!')
 
@@ -0,0 +1,191 @@
+"""
+Сквозной бенчмарк конвейера уведомлений без обращений к Wildberries и Telegram.
+
+Поднимает фейковый WB API (benchmarks.fake_wb_api) в отдельном процессе, заполняет Redis
+(локальный или fakeredis) синтетическими запросами и гоняет NotificationService.monitor_requests
+заданное число тиков. Между тиками фейковый API меняет часть коэффициентов. После тиков очередь
+уведомлений разбирается NotificationDispatcher с фейковым ботом, который только считает сообщения.
+
+Для каждого объема запросов выводит задержку тика, число вызовов API и ответов 429, команды
+и обращения к Redis за тик, поставленные в очередь и отправленные сообщения.
+
+    python -m benchmarks.bench_notifier --fake --requests 1000,10000,100000
+    python -m benchmarks.bench_notifier --redis-url redis://localhost:6379/15 --rate-limit-ratio 0.05
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+import aiohttp
+from loguru import logger
+
+from benchmarks.env import prepare_settings, connect_redis, load_keyboards_module, CommandCounter
+from benchmarks.fake_wb_api import start_fake_api
+
+REQUEST_DATE_FORMAT = '%d.%m.%Y %H:%M'
+
+
+class FakeBot:
+    """Бот, который только считает вызовы send_message."""
+
+    def __init__(self):
+        self.sent = 0
+        self.chats = set()
+
+    async def send_message(self, chat_id, text, reply_markup=None, **kwargs):
+        self.sent += 1
+        self.chats.add(chat_id)
+
+
+def make_requests(count, warehouses, seed):
+    """Генерирует параметры запросов: популярность складов убывает по закону Ципфа."""
+    rng = random.Random(seed)
+    warehouse_ids = list(range(1, warehouses + 1))
+    weights = [1 / rank for rank in range(1, warehouses + 1)]
+    now = datetime.now()
+    for number in range(count):
+        selected = set(rng.choices(warehouse_ids, weights=weights, k=rng.randint(1, 3)))
+        days = rng.choice([1, 3, 7, 30])
+        yield {
+            "user_id": 100000 + number % max(count // 3, 1),
+            "warehouse_ids": [str(warehouse_id) for warehouse_id in selected],
+            "boxTypeID": ",".join(str(box) for box in rng.sample([2, 5, 6], rng.randint(1, 2))),
+            "coefficient": str(rng.choice([0, 1, 2, 3, 5])),
+            "start_date": now.strftime(REQUEST_DATE_FORMAT),
+            "end_date": (now + timedelta(days=days)).strftime(REQUEST_DATE_FORMAT),
+        }
+
+
+async def wait_for_api(session, base_url, timeout=15):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            async with session.get(f"{base_url}/bench/stats") as response:
+                return await response.json()
+        except aiohttp.ClientError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+
+async def run_scale(args, count, redis, counter, base_url, session):
+    from database.redis_base import RedisClient
+    from functions.notify_queue import NotificationDispatcher
+    from functions.task_notify import NotificationService
+    from functions.wb_api import ApiClient
+
+    await redis.flushdb()
+    redis_client = RedisClient(args.redis_url, durability_mode="server")
+    redis_client.redis = redis
+
+    # Справочник складов, как его заполняет database/add_warehouses_base.py
+    async with redis.pipeline(transaction=False) as pipe:
+        for warehouse_id in range(1, args.warehouses + 1):
+            pipe.hset(f"warehouse:{warehouse_id}", mapping={"id": warehouse_id, "name": f"Склад {warehouse_id}"})
+            pipe.sadd("warehouses", warehouse_id)
+        await pipe.execute()
+    await redis_client.load_warehouse_names()
+
+    started = time.perf_counter()
+    batch = []
+    for request in make_requests(count, args.warehouses, args.seed):
+        batch.append(redis_client.save_request(**request))
+        if len(batch) >= 100:
+            await asyncio.gather(*batch)
+            batch = []
+    await asyncio.gather(*batch)
+    load_time = time.perf_counter() - started
+
+    # Много ключей с быстрым пополнением, чтобы бюджет API не ограничивал измерение самого конвейера
+    api_client = ApiClient([f"bench-key-{number}" for number in range(args.keys)], retry_delay=0.1,
+                           key_refill_period=args.key_refill_period, base_url=base_url)
+    await api_client.start()
+    service = NotificationService(api_client, redis_client, bot=None, scheduler=None,
+                                  min_delay_between_requests=args.tick)
+
+    api_before = await wait_for_api(session, base_url)
+    queued_before = await redis_client.notifications_queue_size()
+    latencies, commands, round_trips = [], [], []
+    for tick in range(args.ticks):
+        tick_started = time.perf_counter()
+        before = counter.snapshot()
+        await service.monitor_requests()
+        after = counter.snapshot()
+        latencies.append(time.perf_counter() - tick_started)
+        commands.append(after[0] - before[0])
+        round_trips.append(after[1] - before[1])
+
+        async with session.post(f"{base_url}/bench/advance") as response:
+            await response.read()
+        await asyncio.sleep(max(0.0, service.poll_scheduler.tick_interval - (time.perf_counter() - tick_started)))
+
+    api_after = await wait_for_api(session, base_url)
+    queued = await redis_client.notifications_queue_size() - queued_before
+    await api_client.close()
+
+    bot = FakeBot()
+    dispatcher = NotificationDispatcher(bot, redis_client, workers=args.workers, global_rate=args.telegram_rate,
+                                        per_chat_interval=0)
+    drain_started = time.perf_counter()
+    dispatcher.start()
+    while await redis_client.notifications_queue_size():
+        await asyncio.sleep(0.05)
+    await asyncio.sleep(0.2)
+    await dispatcher.stop()
+    drain_time = time.perf_counter() - drain_started
+
+    latencies_ms = sorted(latency * 1000 for latency in latencies)
+    p95 = latencies_ms[max(int(len(latencies_ms) * 0.95) - 1, 0)]
+    print(f"\n=== {count} запросов, {len(redis_client.subscription_index.warehouse_subscribers)} складов, "
+          f"загрузка {load_time:.1f} сек.")
+    print(f"тик: p50 {statistics.median(latencies_ms):.0f} мс, p95 {p95:.0f} мс, max {latencies_ms[-1]:.0f} мс "
+          f"(первый {latencies[0] * 1000:.0f} мс)")
+    print(f"WB API: {api_after['calls'] - api_before['calls']} вызовов, "
+          f"429: {api_after['rate_limited'] - api_before['rate_limited']}")
+    print(f"Redis за тик: {statistics.mean(commands):.0f} команд, {statistics.mean(round_trips):.1f} обращений")
+    print(f"уведомления: {queued} в очереди, {bot.sent} отправлено {len(bot.chats)} пользователям "
+          f"за {drain_time:.1f} сек.")
+    print(service.tick_stats.summary())
+
+
+async def main(args):
+    prepare_settings(redis_url=args.redis_url)
+    load_keyboards_module()
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+
+    process, base_url = start_fake_api(args.warehouses, args.days, args.churn, args.rate_limit_ratio, args.seed)
+    try:
+        redis = await connect_redis(args.redis_url, fake=args.fake)
+        counter = CommandCounter(redis)
+        async with aiohttp.ClientSession() as session:
+            await wait_for_api(session, base_url)
+            for count in (int(value) for value in args.requests.split(",")):
+                await run_scale(args, count, redis, counter, base_url, session)
+    finally:
+        process.terminate()
+        process.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--redis-url", default="redis://localhost:6379/15")
+    parser.add_argument("--fake", action="store_true", help="использовать fakeredis вместо локального Redis")
+    parser.add_argument("--requests", default="1000,10000,100000", help="объемы запросов через запятую")
+    parser.add_argument("--warehouses", type=int, default=200)
+    parser.add_argument("--days", type=int, default=14)
+    parser.add_argument("--churn", type=float, default=0.02, help="доля слотов, меняющихся между тиками")
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument("--ticks", type=int, default=10)
+    parser.add_argument("--tick", type=float, default=1.0, help="минимальный период тика, сек.")
+    parser.add_argument("--keys", type=int, default=4)
+    parser.add_argument("--key-refill-period", type=float, default=0.5)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--telegram-rate", type=int, default=1000, help="лимит фейкового бота, сообщений в секунду")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--log-level", default="WARNING")
+    asyncio.run(main(parser.parse_args()))
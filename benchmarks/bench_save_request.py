@@ -0,0 +1,105 @@
+"""
+Бенчмарк пропускной способности создания запросов (RedisClient.save_request).
+
+Сравнивает прежний путь записи (pipeline + BGSAVE на каждый запрос) с текущим
+(один pipeline, снимок по настройке durability). Запускается против локального Redis
+или fakeredis (--fake). Fakeredis не форкает процесс, поэтому стоимость BGSAVE
+честно видна только на настоящем Redis.
+
+    python -m benchmarks.bench_save_request --redis-url redis://localhost:6379/15 --count 2000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+from benchmarks.env import prepare_settings, connect_redis
+
+
+def make_request_data(user_id):
+    return {
+        "request_id": str(uuid.uuid4()),
+        "user_id": str(user_id),
+        "status_request": "True",
+        "warehouse_ids": "507,117501,206348",
+        "boxTypeID": "2,5",
+        "coefficient": "1",
+        "start_date": "01.10.2024 10:00",
+        "end_date": "08.10.2024 10:00",
+        "notify_until_first": "False",
+    }
+
+
+async def save_request_baseline(redis, user_id):
+    """Путь записи до изменений: HSET в pipeline и BGSAVE после каждого запроса."""
+    request_data = make_request_data(user_id)
+    key = f"user_request:{user_id}:{request_data['request_id']}"
+    async with redis.pipeline() as pipe:
+        pipe.hset(key, mapping=request_data)
+        await pipe.execute()
+    try:
+        await redis.bgsave()
+    except Exception:
+        # Redis отвечает ошибкой, если предыдущий BGSAVE еще не завершился
+        return False
+    return True
+
+
+async def run(name, save, count, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(user_id):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            if await save(user_id) is False:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(100000 + i % 500) for i in range(count)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"{name:<12} {count / elapsed:10.1f} req/s   p50 {statistics.median(latencies) * 1000:7.2f} ms   "
+          f"p99 {p99 * 1000:7.2f} ms   bgsave errors {errors}")
+
+
+async def main(args):
+    prepare_settings(redis_url=args.redis_url)
+    from database.redis_base import RedisClient
+
+    redis = await connect_redis(args.redis_url, fake=args.fake)
+    await redis.flushdb()
+
+    await run("baseline", lambda user_id: save_request_baseline(redis, user_id), args.count, args.concurrency)
+    await redis.flushdb()
+
+    for mode in ("server", "debounced"):
+        client = RedisClient(args.redis_url, durability_mode=mode, snapshot_interval=args.snapshot_interval)
+        client.redis = redis
+
+        async def save(user_id, client=client):
+            request_data = make_request_data(user_id)
+            await client.save_request(user_id, request_data["warehouse_ids"].split(","), request_data["boxTypeID"],
+                                      request_data["coefficient"], request_data["start_date"],
+                                      request_data["end_date"])
+
+        await run(mode, save, args.count, args.concurrency)
+        if client.snapshot_task:
+            client.snapshot_task.cancel()
+        await redis.flushdb()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--redis-url", default="redis://localhost:6379/15")
+    parser.add_argument("--fake", action="store_true", help="использовать fakeredis вместо локального Redis")
+    parser.add_argument("--count", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--snapshot-interval", type=int, default=300)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,104 @@
+import json
+import os
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BENCH_SETTINGS = {
+    "db": {"database": "bench", "user": "bench", "password": "bench"},
+    "api_token": "123456789:AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA",
+    "base_url": "http://127.0.0.1",
+    "default_key": "bench",
+    "api_key": ["bench-key"],
+    "admins_id": [],
+    "admins_chat": "",
+    "chat_id": 0,
+    "chat_url": "",
+    "support": "",
+    "notify": False,
+    "merchant_id": 0,
+    "first_secret": "",
+    "second_secret": "",
+    "wallet_id": 0,
+    "freekassa_token": "",
+    "requisites": "",
+}
+
+
+def prepare_settings(**overrides):
+    """
+    Создает временный settings.json и переходит в его каталог,
+    чтобы модули бота (loader.load_config) импортировались без боевого конфига.
+    """
+    workdir = tempfile.mkdtemp(prefix="wb_bench_")
+    with open(os.path.join(workdir, "settings.json"), "w") as f:
+        json.dump(dict(BENCH_SETTINGS, **overrides), f, indent=4)
+
+    os.chdir(workdir)
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    return workdir
+
+
+async def connect_redis(redis_url, fake=False):
+    """Возвращает подключение к локальному Redis или к fakeredis."""
+    if fake:
+        from fakeredis import aioredis as fake_aioredis
+        return fake_aioredis.FakeRedis(decode_responses=True)
+
+    import aioredis
+    return await aioredis.from_url(redis_url, decode_responses=True)
+
+
+def load_keyboards_module():
+    """
+    Подключает data/keyboards.py как data.keyboards.
+
+    Пакет data/keyboards/ перекрывает одноименный модуль при обычном импорте, и сборка
+    уведомлений (go_booking) падает. Бенчмарку нужен рабочий путь формирования сообщений,
+    поэтому модуль загружается по пути файла. Вызывать после prepare_settings.
+    """
+    import importlib.util
+    import data
+
+    spec = importlib.util.spec_from_file_location("data.keyboards", os.path.join(REPO_ROOT, "data", "keyboards.py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["data.keyboards"] = module
+    spec.loader.exec_module(module)
+    data.keyboards = module
+    return module
+
+
+class CommandCounter:
+    """Считает команды и сетевые обращения к Redis, оборачивая execute_command и pipeline клиента."""
+
+    def __init__(self, redis):
+        self.commands = 0
+        self.round_trips = 0
+
+        execute_command = redis.execute_command
+        pipeline = redis.pipeline
+
+        async def counted_execute_command(*args, **kwargs):
+            self.commands += 1
+            self.round_trips += 1
+            return await execute_command(*args, **kwargs)
+
+        def counted_pipeline(*args, **kwargs):
+            pipe = pipeline(*args, **kwargs)
+            execute = pipe.execute
+
+            async def counted_execute(*execute_args, **execute_kwargs):
+                self.commands += len(pipe.command_stack)
+                self.round_trips += 1
+                return await execute(*execute_args, **execute_kwargs)
+
+            pipe.execute = counted_execute
+            return pipe
+
+        redis.execute_command = counted_execute_command
+        redis.pipeline = counted_pipeline
+
+    def snapshot(self):
+        return self.commands, self.round_trips
@@ -0,0 +1,99 @@
+"""
+Локальная замена WB API коэффициентов приемки для бенчмарков.
+
+Отдает /api/v1/acceptance/coefficients по синтетическому набору складов, дат и типов коробок,
+меняет часть коэффициентов по POST /bench/advance и по заданной доле запросов отвечает 429.
+Запускается в отдельном процессе, чтобы генерация ответов не конкурировала с измеряемым циклом бота.
+"""
+import json
+import multiprocessing
+import random
+import socket
+from datetime import date, timedelta
+
+from aiohttp import web
+
+BOX_TYPES = {2: "Короба", 5: "Монопаллеты", 6: "Суперсейф"}
+# Большая часть слотов закрыта (-1), остальные распределены по типичным коэффициентам
+COEFFICIENTS = [-1] * 14 + [0, 0, 1, 1, 2, 3, 5, 10, 20]
+
+
+class FakeWbApi:
+    def __init__(self, warehouses, days, churn=0.05, rate_limit_ratio=0.0, seed=1):
+        self.random = random.Random(seed)
+        self.churn = churn
+        self.rate_limit_ratio = rate_limit_ratio
+        today = date.today()
+        self.dates = [(today + timedelta(days=day)).strftime("%Y-%m-%dT00:00:00Z") for day in range(days)]
+        self.slots = {
+            warehouse_id: {(box_type_id, slot_date): self.random.choice(COEFFICIENTS)
+                           for box_type_id in BOX_TYPES for slot_date in self.dates}
+            for warehouse_id in range(1, warehouses + 1)
+        }
+        self.cache = {}  # warehouse_id -> готовый список записей ответа
+        self.calls = 0
+        self.rate_limited = 0
+        self.slots_changed = 0
+
+    def entries(self, warehouse_id):
+        cached = self.cache.get(warehouse_id)
+        if cached is None:
+            cached = self.cache[warehouse_id] = [
+                {"date": slot_date, "coefficient": coefficient, "warehouseID": warehouse_id,
+                 "warehouseName": f"Склад {warehouse_id}", "boxTypeID": box_type_id,
+                 "boxTypeName": BOX_TYPES[box_type_id]}
+                for (box_type_id, slot_date), coefficient in self.slots.get(warehouse_id, {}).items()
+            ]
+        return cached
+
+    async def coefficients(self, request):
+        self.calls += 1
+        if self.random.random() < self.rate_limit_ratio:
+            self.rate_limited += 1
+            return web.json_response({"detail": "too many requests"}, status=429, headers={"X-Ratelimit-Retry": "1"})
+
+        warehouse_ids = [int(item) for item in request.query.get("warehouse_ids", "").split(",") if item.isdigit()]
+        body = []
+        for warehouse_id in warehouse_ids:
+            body.extend(self.entries(warehouse_id))
+        return web.Response(body=json.dumps(body).encode(), content_type="application/json")
+
+    async def advance(self, request):
+        """Меняет коэффициенты у доли слотов, равной churn."""
+        changed = 0
+        for warehouse_id, slots in self.slots.items():
+            for key in slots:
+                if self.random.random() < self.churn:
+                    slots[key] = self.random.choice(COEFFICIENTS)
+                    self.cache.pop(warehouse_id, None)
+                    changed += 1
+        self.slots_changed += changed
+        return web.json_response({"changed": changed})
+
+    async def stats(self, request):
+        return web.json_response({"calls": self.calls, "rate_limited": self.rate_limited,
+                                  "slots_changed": self.slots_changed})
+
+
+def serve(port, warehouses, days, churn, rate_limit_ratio, seed):
+    api = FakeWbApi(warehouses, days, churn, rate_limit_ratio, seed)
+    app = web.Application()
+    app.router.add_get("/api/v1/acceptance/coefficients", api.coefficients)
+    app.router.add_post("/bench/advance", api.advance)
+    app.router.add_get("/bench/stats", api.stats)
+    web.run_app(app, host="127.0.0.1", port=port, print=None, handle_signals=False)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_fake_api(warehouses, days, churn=0.05, rate_limit_ratio=0.0, seed=1):
+    """Запускает фейковый API в отдельном процессе и возвращает (процесс, базовый URL)."""
+    port = free_port()
+    process = multiprocessing.Process(target=serve, args=(port, warehouses, days, churn, rate_limit_ratio, seed),
+                                      daemon=True)
+    process.start()
+    return process, f"http://127.0.0.1:{port}"
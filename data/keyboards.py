@@ -161,6 +161,15 @@ def notification_count_markup() -> InlineKeyboardMarkup:
     return markup
 
 
+def notify_policy_markup() -> InlineKeyboardMarkup:
+    """Создает клавиатуру для выбора политики повторных уведомлений."""
+    markup = InlineKeyboardMarkup(row_width=1)
+    markup.add(*(InlineKeyboardButton(text=p[0], callback_data=f"policy_{key}")
+                 for key, p in texts.notify_policy_map.items()))
+    markup.row(InlineKeyboardButton(text="❌ Закрыть", callback_data="close_callback"))
+    return markup
+
+
 def go_booking() -> InlineKeyboardMarkup:
     """Создает клавиатуру для запуска бота."""
     return InlineKeyboardMarkup(row_width=1).add(
@@ -177,8 +186,7 @@ async def requests_keyboard(user_requests, redis_client):
         warehouse_id = request.get('warehouse_ids')
         warehouse_id_list = warehouse_id.split(',') if warehouse_id else []
 
-        warehouse_names = [await redis_client.get_warehouse_name(wh_id) for wh_id in warehouse_id_list]
-        warehouse_name = ', '.join(warehouse_names)
+        warehouse_name = ', '.join(await redis_client.get_warehouse_names(warehouse_id_list))
 
         date = request.get('start_date')
 
@@ -35,6 +35,10 @@ select_alert_text = (
     "<i>Сколько раз вас уведомить?"
     "(Например если выбрать до первого уведомления, то система пришлёт первый подходящий под ваши параметры слот и всё)</i>"
 )
+select_policy_text = (
+    "<b>➕ Создание запроса:</b>\n\n"
+    "<i>Когда присылать повторные уведомления по одному и тому же слоту?</i>"
+)
 faq_text = (
     "<b>❓ Как это работает:</b>\n\n"
     "<b>Принцип работы бота.</b>\n\n"
@@ -117,6 +121,12 @@ alert_text = (
     "<i><b>Тип поставки:</b> {boxTypeName}</i>\n"
     "<i><b>Коэффициент:</b> {coefficient}</i>\n"
 )
+digest_header_text = (
+    "<b>🔥 Найдено слотов: {count}</b>{part}\n\n"
+)
+digest_item_text = (
+    "<i><b>{date}</b> · {warehouseName} · {boxTypeName} · коэф. {coefficient}</i>"
+)
 
 details_text = (
     "<b>📋 Запрос №{number} (<i>{date}</i>):\n\n"
@@ -162,6 +172,14 @@ types_map = {
     "Суперсейф": ("super_safe", 6),
 }
 
+notify_policy_map = {
+    "change": ("Когда слот появился или вошел в диапазон", ("change", 0)),
+    "reappear": ("Только при повторном появлении слота", ("reappear", 0)),
+    "improvement": ("Только при снижении коэффициента", ("improvement", 0)),
+    "cooldown10": ("Повторять каждые 10 минут", ("cooldown", 600)),
+    "cooldown60": ("Повторять каждый час", ("cooldown", 3600)),
+}
+
 period_map = {
     "today": ("Сегодня", 0),
     "tomorrow": ("Завтра", 1),
@@ -25,6 +25,7 @@ for center in centers:
     key = f"warehouse:{center['id']}"
     redis_conn.hset(key, 'id', center['id'])
     redis_conn.hset(key, 'name', center['name'])
+    redis_conn.sadd('warehouses', center['id'])
     print(f"{key} -> {center}")
 
 print("Данные успешно вставлены!")
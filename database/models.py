@@ -1,6 +1,13 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
 from peewee import *
 from playhouse.shortcuts import ReconnectMixin
-from playhouse.postgres_ext import PostgresqlExtDatabase
+try:
+    from playhouse.postgres_ext import PooledPostgresqlExtDatabase
+except ImportError:  # peewee 3.x
+    from playhouse.pool import PooledPostgresqlExtDatabase
 
 from utils.datefunc import datetime_local_now
 from loader import load_config
@@ -8,19 +15,47 @@ from loader import load_config
 config = load_config()
 
 
-class DB(ReconnectMixin, PostgresqlExtDatabase):
-    pass
+class DB(ReconnectMixin, PooledPostgresqlExtDatabase):
+    # Ошибки psycopg2, после которых соединение можно переоткрыть (по умолчанию в миксине только MySQL)
+    reconnect_errors = ReconnectMixin.reconnect_errors + (
+        (OperationalError, 'server closed the connection'),
+        (OperationalError, 'terminating connection'),
+        (InterfaceError, 'connection already closed'),
+    )
+
+    def execute_sql(self, sql, params=None, *args, **kwargs):
+        # Пробрасываем дополнительные аргументы (named_cursor и др.), которые миксин не принимает
+        return self._reconnect(super(ReconnectMixin, self).execute_sql, sql, params, *args, **kwargs)
 
 
 base = DB(
     database=config.db.database,
     user=config.db.user,
     password=config.db.password,
-    host="localhost",
-    port=5432,
+    host=config.db.host,
+    port=config.db.port,
+    max_connections=config.db.max_connections,
+    stale_timeout=config.db.stale_timeout,
+    timeout=config.db.pool_timeout,
 )
 
 
+# Запросы peewee блокирующие: выполняем их в отдельном пуле потоков, соединения берутся из пула на время вызова
+executor = ThreadPoolExecutor(max_workers=config.db.pool_size, thread_name_prefix="postgres")
+
+
+def call_with_connection(func, *args, **kwargs):
+    """Выполняет функцию на соединении из пула и возвращает его в пул после вызова."""
+    with base.connection_context():
+        return func(*args, **kwargs)
+
+
+async def run_db(func, *args, **kwargs):
+    """Выполняет блокирующую работу с БД в пуле потоков Postgres, не блокируя цикл событий."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, partial(call_with_connection, func, *args, **kwargs))
+
+
 class BaseModel(Model):
     class Meta:
         database = base
@@ -49,15 +84,16 @@ class Subscription(BaseModel):
 
 
 def connect():
-    base.connect()
-    base.create_tables(
-        [
-        User,
-        Payment,
-        Subscription
-        ]
-    )
+    with base.connection_context():
+        base.create_tables(
+            [
+            User,
+            Payment,
+            Subscription
+            ]
+        )
 
 
 def disconnect():
-    base.close()
+    executor.shutdown(wait=False)
+    base.close_all()
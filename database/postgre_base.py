@@ -1,13 +1,14 @@
-from typing import Optional
+from typing import Optional, Union
 from datetime import datetime, timedelta, date
 
-from database.models import User, Payment, Subscription
+from database.models import User, Payment, Subscription, run_db
 from utils.datefunc import normalized_local_now
 from loader import config
 
 
 async def create_user(user_id: int, name: str, username: str, subscription: bool = False, sub_date: Optional[date] = None):
-    user = User.create(
+    user = await run_db(
+        User.create,
         user_id=user_id,
         name=name,
         username=username,
@@ -16,13 +17,32 @@ async def create_user(user_id: int, name: str, username: str, subscription: bool
     return user
 
 
-def check_subscription(user: User) -> Optional[Subscription]:
+async def get_user(user_id: int) -> Optional[User]:
+    return await run_db(User.get_or_none, User.user_id == user_id)
+
+
+async def save_user(user_id: int, name: str, username: str):
     """
-    Возвращает активную подписку пользователя, если она существует.
+    Создает пользователя или обновляет его имя и username, если они изменились.
 
-    :param user: Экземпляр модели User
-    :return: Активная подписка (Subscription) или None, если активной подписки нет
+    :return: Кортеж (User, True если пользователь создан)
     """
+    def save():
+        user = User.get_or_none(User.user_id == user_id)
+        if user is None:
+            return User.create(user_id=user_id, name=name, username=username), True
+
+        if user.name != name or user.username != username:
+            user.name = name
+            user.username = username
+            user.save()
+        return user, False
+
+    return await run_db(save)
+
+
+def get_active_subscription(user: Union[User, int]) -> Optional[Subscription]:
+    """Синхронно возвращает активную подписку пользователя (для вызова внутри пула потоков БД)."""
     return (Subscription
             .select()
             .where(
@@ -32,6 +52,16 @@ def check_subscription(user: User) -> Optional[Subscription]:
             .first())
 
 
+async def check_subscription(user: Union[User, int]) -> Optional[Subscription]:
+    """
+    Возвращает активную подписку пользователя, если она существует.
+
+    :param user: Экземпляр модели User или ID пользователя
+    :return: Активная подписка (Subscription) или None, если активной подписки нет
+    """
+    return await run_db(get_active_subscription, user)
+
+
 async def create_payment(user_id: int, summ: int, payment_status: bool = False):
     """
     Создает новую запись платежа для пользователя.
@@ -41,17 +71,27 @@ async def create_payment(user_id: int, summ: int, payment_status: bool = False):
     :param payment_status: Статус платежа (по умолчанию False)
     :return: Объект Payment
     """
+    def create():
+        user = User.get(User.user_id == user_id)
 
-    user = User.get(User.user_id == user_id)
+        payment_date = normalized_local_now().strftime('%Y-%m-%d %H:%M:%S')
 
-    payment_date = normalized_local_now().strftime('%Y-%m-%d %H:%M:%S')
+        return Payment.create(
+            user=user,
+            date=payment_date,
+            summ=summ,
+            payment_status=payment_status
+        )
+
+    return await run_db(create)
+
+
+def update_last_payment_status(user_id: int, new_status: bool):
+    payment = Payment.select().where(Payment.user_id == user_id).order_by(Payment.date.desc()).get()
+
+    payment.payment_status = new_status
+    payment.save()
 
-    payment = Payment.create(
-        user=user,
-        date=payment_date,
-        summ=summ,
-        payment_status=payment_status
-    )
     return payment
 
 
@@ -64,12 +104,7 @@ async def set_pay_status(user_id: int, new_status: bool):
     :return: Обновленный объект Payment или None, если запись не найдена
     """
     try:
-        payment = Payment.select().where(Payment.user_id == user_id).order_by(Payment.date.desc()).get()
-
-        payment.payment_status = new_status
-        payment.save()
-
-        return payment
+        return await run_db(update_last_payment_status, user_id, new_status)
 
     except Payment.DoesNotExist:
         return None
@@ -87,12 +122,7 @@ async def set_sub_status(user_id: int, new_status: bool):
     :return: Обновленный объект Payment или None, если запись не найдена
     """
     try:
-        payment = Payment.select().where(Payment.user_id == user_id).order_by(Payment.date.desc()).get()
-
-        payment.payment_status = new_status
-        payment.save()
-
-        return payment
+        return await run_db(update_last_payment_status, user_id, new_status)
 
     except Payment.DoesNotExist:
         return None
@@ -102,27 +132,30 @@ async def set_sub_status(user_id: int, new_status: bool):
 
 
 async def grant_subscription(user_id: int, sub_days: int):
-    user = User.get_or_none(User.user_id == user_id)
-    if not user:
-        return
-
-    now = normalized_local_now()
-    active_subscription = check_subscription(user)
-
-    if active_subscription and active_subscription.end_date:
-        new_end_date = active_subscription.end_date + timedelta(days=sub_days)
-        active_subscription.end_date = new_end_date
-        active_subscription.save()
-        return active_subscription  # Возвращаем обновленную подписку
-    else:
-        new_end_date = now + timedelta(days=sub_days)
-        new_subscription = Subscription.create(
-            user=user,
-            start_date=now,
-            end_date=new_end_date,
-            is_active=True
-        )
-        return new_subscription  # Возвращаем новую подписку
+    def grant():
+        user = User.get_or_none(User.user_id == user_id)
+        if not user:
+            return
+
+        now = normalized_local_now()
+        active_subscription = get_active_subscription(user)
+
+        if active_subscription and active_subscription.end_date:
+            new_end_date = active_subscription.end_date + timedelta(days=sub_days)
+            active_subscription.end_date = new_end_date
+            active_subscription.save()
+            return active_subscription  # Возвращаем обновленную подписку
+        else:
+            new_end_date = now + timedelta(days=sub_days)
+            new_subscription = Subscription.create(
+                user=user,
+                start_date=now,
+                end_date=new_end_date,
+                is_active=True
+            )
+            return new_subscription  # Возвращаем новую подписку
+
+    return await run_db(grant)
 
 
 
@@ -135,8 +168,8 @@ async def update_subscription_status(user_id: int, additional_days: int):
     :param additional_days: Количество дней, на которое продлевается подписка
     :return: Обновленный объект User или None, если пользователь не найден
     """
-    try:
-        user = await User.get(User.user_id == user_id)
+    def update():
+        user = User.get(User.user_id == user_id)
 
         # Проверяем, если подписка активна и еще не истекла
         if user.sub_date and user.sub_date >= normalized_local_now().date():
@@ -147,13 +180,16 @@ async def update_subscription_status(user_id: int, additional_days: int):
             user.sub_date = normalized_local_now().date() + timedelta(days=additional_days)
 
         user.subscription = True  # Активируем подписку
-        await user.save()  # Сохраняем изменения в базе данных
+        user.save()  # Сохраняем изменения в базе данных
         return user
 
+    try:
+        return await run_db(update)
+
     except User.DoesNotExist:
         print(f"Пользователь с ID {user_id} не найден.")
         return None
 
     except Exception as e:
         print(f"Произошла ошибка при обновлении статуса подписки: {e}")
-        return None
\ No newline at end of file
+        return None
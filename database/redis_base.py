@@ -1,14 +1,61 @@
 import aioredis
+import asyncio
+import json
+import time
 import uuid
 
 from loguru import logger
 from loader import config
+from functions.subscription_index import SubscriptionIndex
+from functions.active_request import ActiveRequest
+from utils.datefunc import local_tz
+from utils.metrics import REDIS_LATENCY, NOTIFICATIONS_QUEUE_DEPTH, ACTIVE_REQUESTS
+
+
+ALL_REQUESTS_KEY = "user_requests:all"
+ACTIVE_REQUESTS_KEY = "user_requests:active"
+EXPIRY_KEY = "user_requests:expiry"
+WAREHOUSES_KEY = "warehouses"
+NOTIFICATIONS_KEY = "notifications"
+DELAYED_NOTIFICATIONS_KEY = "notifications:delayed"  # ZSET: уведомление -> время, раньше которого его нельзя слать
+
+
+def user_requests_key(user_id):
+    return f"user_requests:user:{user_id}"
+
+
+def request_key(user_id, request_id):
+    return f"user_request:{user_id}:{request_id}"
+
+
+def notification_key(message_id):
+    """Ключ пометки об отправке: компактный бинарный для структурных ключей, строковый для остальных."""
+    if isinstance(message_id, bytes):
+        return b"ns:" + message_id
+    return f"notification_sent:{message_id}"
+
+
+def notify_state_key(request_id):
+    """Хэш последних отправленных коэффициентов по слотам запроса (режим «только при снижении»)."""
+    return f"notify_state:{request_id}"
+
+
+def expiry_score(end_date):
+    """Переводит дату окончания запроса (локальное время) в unix timestamp для ZSET истечения."""
+    end = ActiveRequest.parse_date(end_date)
+    return local_tz.localize(end).timestamp() if end else None
 
 
 class RedisClient:
-    def __init__(self, redis_url):
+    def __init__(self, redis_url, durability_mode=None, snapshot_interval=None):
         self.redis_url = redis_url
         self.redis = None
+        self.subscription_index = SubscriptionIndex()
+        self.durability_mode = durability_mode or config.redis_durability
+        self.snapshot_interval = snapshot_interval if snapshot_interval is not None else config.redis_snapshot_interval
+        self.last_snapshot = 0.0
+        self.snapshot_task = None
+        self.warehouse_names = {}  # warehouse_id (str) -> name, справочник складов в памяти процесса
 
     async def ensure_connection(self):
         if not self.redis:
@@ -23,11 +70,73 @@ class RedisClient:
         if not self.redis:
             self.redis = await aioredis.from_url(self.redis_url, decode_responses=True)
 
+    def schedule_snapshot(self):
+        """Планирует отложенный BGSAVE, объединяя все записи за snapshot_interval в один снимок."""
+        if self.durability_mode != "debounced":
+            return
+        if self.snapshot_task and not self.snapshot_task.done():
+            return
+        self.snapshot_task = asyncio.ensure_future(self.delayed_snapshot())
+
+    async def delayed_snapshot(self):
+        delay = self.last_snapshot + self.snapshot_interval - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        try:
+            await self.redis.bgsave()
+            logger.debug("Запущено фоновое сохранение Redis (BGSAVE).")
+        except Exception as e:
+            logger.warning(f"Не удалось запустить BGSAVE: {e}")
+        finally:
+            self.last_snapshot = time.monotonic()
+
+    async def hgetall_many(self, keys, batch_size=1000):
+        """Получает хэши по списку ключей пакетами через pipeline, пропуская отсутствующие."""
+        results = []
+        keys = list(keys)
+        for i in range(0, len(keys), batch_size):
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key in keys[i:i + batch_size]:
+                    pipe.hgetall(key)
+                results.extend(await pipe.execute())
+        return [item for item in results if item]
+
+    async def rebuild_indexes(self):
+        """Перестраивает индексные множества запросов и складов по существующим ключам (через SCAN)."""
+        await self.ensure_connection()
+        try:
+            request_keys = [key async for key in self.redis.scan_iter(match="user_request:*", count=1000)]
+            requests = await self.hgetall_many(request_keys)
+
+            async with self.redis.pipeline() as pipe:
+                pipe.delete(ALL_REQUESTS_KEY, ACTIVE_REQUESTS_KEY, EXPIRY_KEY)
+                for request_data in requests:
+                    if not request_data.get('user_id') or not request_data.get('request_id'):
+                        continue  # неполный хэш (например, остаток от удаленного по сроку запроса)
+                    key = request_key(request_data.get('user_id'), request_data.get('request_id'))
+                    pipe.sadd(ALL_REQUESTS_KEY, key)
+                    pipe.sadd(user_requests_key(request_data.get('user_id')), key)
+                    if request_data.get('status_request') == 'True':
+                        pipe.sadd(ACTIVE_REQUESTS_KEY, key)
+                        score = expiry_score(request_data.get('end_date'))
+                        if score:
+                            pipe.zadd(EXPIRY_KEY, {key: score})
+                await pipe.execute()
+
+            warehouse_ids = [key.split(":", 1)[1]
+                             async for key in self.redis.scan_iter(match="warehouse:*", count=1000)]
+            if warehouse_ids:
+                await self.redis.sadd(WAREHOUSES_KEY, *warehouse_ids)
+
+            logger.info(f"Индексы Redis перестроены: {len(requests)} запросов, {len(warehouse_ids)} складов.")
+        except Exception as e:
+            logger.exception(f"Ошибка при перестроении индексов Redis: {e}")
+
     async def save_request(self, user_id, warehouse_ids, boxTypeID, coefficient, start_date, end_date,
-                           status_request=True, notify_until_first=False):
+                           status_request=True, notify_until_first=False, notify_policy="change", notify_cooldown=0):
         await self.ensure_connection()
         unique_id = str(uuid.uuid4())
-        key = f"user_request:{user_id}:{unique_id}"
+        key = request_key(user_id, unique_id)
 
         try:
             coefficient = int(coefficient) if coefficient else 0
@@ -43,14 +152,25 @@ class RedisClient:
             "coefficient": str(coefficient),  # Сохраняем как строку
             "start_date": start_date,
             "end_date": end_date,
-            "notify_until_first": str(notify_until_first)
+            "notify_until_first": str(notify_until_first),
+            "notify_policy": notify_policy,
+            "notify_cooldown": str(notify_cooldown)
         }
 
         try:
             async with self.redis.pipeline() as pipe:
-                await pipe.hmset(key, mapping=request_data)
+                pipe.hset(key, mapping=request_data)
+                pipe.sadd(ALL_REQUESTS_KEY, key)
+                pipe.sadd(user_requests_key(user_id), key)
+                if status_request:
+                    pipe.sadd(ACTIVE_REQUESTS_KEY, key)
+                    score = expiry_score(end_date)
+                    if score:
+                        pipe.zadd(EXPIRY_KEY, {key: score})
                 await pipe.execute()
-            await self.redis.bgsave()
+            self.schedule_snapshot()
+            if status_request:
+                self.subscription_index.add(request_data)
         except Exception as e:
             logger.exception(f"Ошибка при сохранении запроса пользователя {user_id} в Redis: {e}")
 
@@ -61,16 +181,25 @@ class RedisClient:
             return []
 
         try:
-            keys_pattern = f"user_request:{user_id}:*"
-            keys = await self.redis.keys(keys_pattern)
+            keys = sorted(await self.redis.smembers(user_requests_key(user_id)))
 
             if not keys:
                 return []
 
-            async with self.redis.pipeline() as pipe:
+            async with self.redis.pipeline(transaction=False) as pipe:
                 for key in keys:
                     pipe.hgetall(key)
-                user_requests = await pipe.execute()
+                results = await pipe.execute()
+
+            # Удаляем из индексов ссылки на запросы, хэши которых уже удалены по сроку хранения
+            archived = [key for key, request_data in zip(keys, results) if not request_data]
+            if archived:
+                async with self.redis.pipeline() as pipe:
+                    pipe.srem(user_requests_key(user_id), *archived)
+                    pipe.srem(ALL_REQUESTS_KEY, *archived)
+                    await pipe.execute()
+
+            user_requests = [request_data for request_data in results if request_data]
 
             return [req for req in user_requests if req.get("user_id") == str(user_id)]
         except Exception as e:
@@ -78,25 +207,48 @@ class RedisClient:
             return []
 
     async def get_warehouse_name(self, warehouse_id):
-        await self.ensure_connection()
         """Получает имя склада по его идентификатору."""
-        warehouse = await self.get_warehouse_by_id(warehouse_id)
-        return warehouse.get('name', 'Неизвестный склад') if warehouse else 'Неизвестный склад'
+        return (await self.get_warehouse_names([warehouse_id]))[0]
+
+    async def get_warehouse_names(self, warehouse_ids):
+        """Возвращает имена складов из справочника в памяти, догружая отсутствующие одним pipeline."""
+        warehouse_ids = [str(warehouse_id) for warehouse_id in warehouse_ids]
+        missing = [warehouse_id for warehouse_id in dict.fromkeys(warehouse_ids)
+                   if warehouse_id not in self.warehouse_names]
+
+        if missing:
+            await self.ensure_connection()
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for warehouse_id in missing:
+                        pipe.hget(f"warehouse:{warehouse_id}", "name")
+                    names = await pipe.execute()
+
+                for warehouse_id, name in zip(missing, names):
+                    if name:
+                        self.warehouse_names[warehouse_id] = name
+            except Exception as e:
+                logger.exception(f"Ошибка при получении имен складов {missing} из Redis: {e}")
+
+        return [self.warehouse_names.get(warehouse_id, 'Неизвестный склад') for warehouse_id in warehouse_ids]
+
+    async def load_warehouse_names(self):
+        """Загружает (или обновляет) справочник имен складов в память процесса."""
+        warehouses = await self.get_warehouses_list()
+        if warehouses:
+            self.warehouse_names = {str(warehouse['id']): warehouse['name'] for warehouse in warehouses}
+            logger.info(f"Справочник складов обновлен: {len(self.warehouse_names)} складов.")
+        return self.warehouse_names
 
     async def get_requests_list(self):
         await self.ensure_connection()
         """Получает все активные запросы пользователей из Redis."""
         try:
-            keys = await self.redis.keys('user_request:*')
+            keys = [key async for key in self.redis.sscan_iter(ALL_REQUESTS_KEY, count=1000)]
             if not keys:
                 return []
 
-            async with self.redis.pipeline() as pipe:
-                for key in keys:
-                    pipe.hgetall(key)
-                user_requests = await pipe.execute()
-
-            return user_requests
+            return await self.hgetall_many(keys)
         except Exception as e:
             logger.exception(f"Ошибка при получении запросов пользователей: {e}")
             return []
@@ -114,14 +266,11 @@ class RedisClient:
         """Получает список всех складов из Redis."""
         await self.ensure_connection()
         try:
-            keys = await self.redis.keys("warehouse:*")
-            if not keys:
+            warehouse_ids = await self.redis.smembers(WAREHOUSES_KEY)
+            if not warehouse_ids:
                 return []
 
-            async with self.redis.pipeline() as pipe:
-                for key in keys:
-                    pipe.hgetall(key)
-                warehouses = await pipe.execute()
+            warehouses = await self.hgetall_many(f"warehouse:{warehouse_id}" for warehouse_id in warehouse_ids)
 
             return [{"id": wh['id'], "name": wh['name']} for wh in warehouses if wh]
         except Exception as e:
@@ -153,13 +302,19 @@ class RedisClient:
         """Изменяет статус запроса пользователя на 'False'."""
         await self.ensure_connection()
         try:
-            request_key = f"user_request:{user_id}:{request_id}"
+            key = request_key(user_id, request_id)
 
-            if not await self.redis.exists(request_key):
+            if not await self.redis.exists(key):
                 logger.error(f"Запрос не найден для пользователя: {user_id} с request_id: {request_id}")
                 return False
 
-            result = await self.redis.hset(request_key, 'status_request', 'False')
+            async with self.redis.pipeline() as pipe:
+                pipe.hset(key, 'status_request', 'False')
+                pipe.srem(ACTIVE_REQUESTS_KEY, key)
+                pipe.zrem(EXPIRY_KEY, key)
+                pipe.delete(notify_state_key(request_id))
+                result, _, _, _ = await pipe.execute()
+            self.subscription_index.remove(request_id)
             if result is not None and result > 0:
                 logger.info(f"Статус запроса {request_id} для пользователя {user_id} успешно обновлен на False.")
                 return True
@@ -172,44 +327,336 @@ class RedisClient:
             return False
 
 
-    async def add_notify(self, user_id, message):
+    async def stop_user_requests(self, user_id):
+        """Деактивирует все активные запросы пользователя одним pipeline."""
+        await self.ensure_connection()
+        try:
+            keys = await self.redis.smembers(user_requests_key(user_id))
+            count = await self.deactivate_requests(keys)
+            logger.info(f"Все запросы пользователя {user_id} деактивированы ({count} шт.).")
+            return count
+        except Exception as e:
+            logger.error(f"Ошибка при деактивации запросов пользователя {user_id}: {e}")
+            return 0
+
+    async def stop_users_requests(self, user_ids):
+        """Деактивирует запросы нескольких пользователей: один pipeline на чтение ключей и один на деактивацию."""
+        user_ids = list(user_ids)
+        if not user_ids:
+            return 0
+
+        await self.ensure_connection()
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for user_id in user_ids:
+                    pipe.smembers(user_requests_key(user_id))
+                results = await pipe.execute()
+
+            count = await self.deactivate_requests([key for keys in results for key in keys])
+            logger.info(f"Запросы {len(user_ids)} пользователей деактивированы ({count} шт.).")
+            return count
+        except Exception as e:
+            logger.error(f"Ошибка при деактивации запросов пользователей {user_ids}: {e}")
+            return 0
+
+    async def deactivate_requests(self, keys, archive_ttl=None):
+        """
+        Деактивирует пачку запросов по их ключам одним pipeline.
+
+        Статус меняется только у запросов, которые еще активны: в множествах пользователей остаются ссылки
+        на хэши, уже удаленные по сроку хранения, и HSET создал бы на их месте хэши-заглушки без TTL.
+
+        :param archive_ttl: Если задан, хэши запросов удаляются из Redis через archive_ttl секунд
+        :return: Количество деактивированных запросов
+        """
+        keys = list(keys)
+        if not keys:
+            return 0
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.sismember(ACTIVE_REQUESTS_KEY, key)
+            active = await pipe.execute()
+
+        async with self.redis.pipeline() as pipe:
+            for key, is_active in zip(keys, active):
+                if is_active:
+                    pipe.hset(key, 'status_request', 'False')
+                    if archive_ttl:
+                        pipe.expire(key, archive_ttl)
+                pipe.srem(ACTIVE_REQUESTS_KEY, key)
+                pipe.zrem(EXPIRY_KEY, key)
+            await pipe.execute()
+
+        for key in keys:
+            self.subscription_index.remove(key.rsplit(':', 1)[-1])
+        return sum(1 for is_active in active if is_active)
+
+    async def expire_requests(self, now=None, batch_size=500):
+        """
+        Деактивирует запросы, у которых истекла дата окончания, выбирая их из ZSET истечения пачками.
+
+        Стоимость пропорциональна числу истекающих запросов, а не общему числу запросов в Redis.
+        """
+        await self.ensure_connection()
+        now = now or time.time()
+        archive_ttl = config.request_archive_days * 86400 if config.request_archive_days else None
+        count = 0
+        try:
+            while True:
+                keys = await self.redis.zrangebyscore(EXPIRY_KEY, '-inf', now, start=0, num=batch_size)
+                if not keys:
+                    break
+                count += await self.deactivate_requests(keys, archive_ttl=archive_ttl)
+
+            if count:
+                logger.info(f"Деактивировано истекших запросов: {count}.")
+            return count
+        except Exception as e:
+            logger.error(f"Ошибка при деактивации истекших запросов: {e}")
+            return 0
+
+    async def complete_requests(self, requests):
+        """
+        Атомарно завершает запросы после первого уведомления одной транзакцией.
+
+        :param requests: Пары (user_id, request_id)
+        :return: Множество request_id, завершенных этим вызовом; запросы, уже завершенные
+                 другим вызовом (в том числе из параллельного тика), в него не попадают
+        """
+        requests = list(requests)
+        if not requests:
+            return set()
+
+        await self.ensure_connection()
+        try:
+            async with self.redis.pipeline() as pipe:
+                for user_id, request_id in requests:
+                    key = request_key(user_id, request_id)
+                    pipe.srem(ACTIVE_REQUESTS_KEY, key)
+                    pipe.hset(key, 'status_request', 'False')
+                    pipe.zrem(EXPIRY_KEY, key)
+                results = await pipe.execute()
+            return {request_id for (_, request_id), removed in zip(requests, results[::3]) if removed == 1}
+        except Exception as e:
+            logger.error(f"Ошибка при завершении {len(requests)} запросов после первого уведомления: {e}")
+            return set()
+        finally:
+            for _, request_id in requests:
+                self.subscription_index.remove(request_id)
+
+    @staticmethod
+    def pack_notify(user_id, message, reply_markup=None):
+        return json.dumps({"user_id": int(user_id), "text": message, "reply_markup": reply_markup},
+                          ensure_ascii=False)
+
+    async def add_notify(self, user_id, message, reply_markup=None):
         """Добавление уведомления в очередь."""
         await self.ensure_connection()
         try:
-            await self.redis.rpush('notifications', f'{user_id}:{message}')
+            await self.redis.rpush(NOTIFICATIONS_KEY, self.pack_notify(user_id, message, reply_markup))
             logger.info(f"Уведомление для пользователя {user_id} добавлено в очередь.")
         except Exception as e:
             logger.error(f"Ошибка при добавлении уведомления для пользователя {user_id} в очередь: {e}")
 
+    async def add_notify_many(self, notifications):
+        """Добавляет пачку уведомлений (user_id, message, reply_markup) в очередь одной командой."""
+        if not notifications:
+            return
+        await self.ensure_connection()
+        try:
+            with REDIS_LATENCY.time(operation="add_notify_many"):
+                await self.redis.rpush(NOTIFICATIONS_KEY, *(self.pack_notify(*item) for item in notifications))
+            logger.info(f"В очередь добавлено {len(notifications)} уведомлений.")
+        except Exception as e:
+            logger.error(f"Ошибка при добавлении {len(notifications)} уведомлений в очередь: {e}")
+
+    async def pop_notify(self, timeout=1):
+        """Извлекает следующее уведомление из очереди, ожидая не дольше timeout секунд."""
+        await self.ensure_connection()
+        item = await self.redis.blpop(NOTIFICATIONS_KEY, timeout=timeout)
+        if not item:
+            return None
+
+        _, payload = item
+        try:
+            return json.loads(payload)
+        except ValueError:
+            # Старый формат очереди: "user_id:message"
+            user_id, _, message = payload.partition(':')
+            return {"user_id": int(user_id), "text": message, "reply_markup": None}
+
+    async def requeue_notify(self, notification):
+        """Возвращает уведомление в начало очереди (например, после RetryAfter)."""
+        await self.ensure_connection()
+        await self.redis.lpush(NOTIFICATIONS_KEY, self.pack_notify(
+            notification["user_id"], notification["text"], notification.get("reply_markup")))
+
+    async def defer_notify(self, notification, send_at):
+        """Откладывает уведомление до send_at (unix timestamp), не занимая воркер ожиданием."""
+        await self.ensure_connection()
+        payload = json.dumps({**notification, "send_at": send_at, "id": uuid.uuid4().hex}, ensure_ascii=False)
+        await self.redis.zadd(DELAYED_NOTIFICATIONS_KEY, {payload: send_at})
+
+    async def promote_notify(self, now=None, batch_size=100):
+        """
+        Переносит отложенные уведомления, время которых наступило, в начало очереди.
+
+        Переносится только то, что удалось удалить из ZSET, поэтому параллельные вызовы не дублируют уведомления.
+        :return: Количество перенесенных уведомлений
+        """
+        await self.ensure_connection()
+        due = await self.redis.zrangebyscore(DELAYED_NOTIFICATIONS_KEY, '-inf', now or time.time(),
+                                             start=0, num=batch_size)
+        if not due:
+            return 0
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for payload in due:
+                pipe.zrem(DELAYED_NOTIFICATIONS_KEY, payload)
+            removed = await pipe.execute()
+
+        payloads = [payload for payload, ok in zip(due, removed) if ok]
+        if payloads:
+            # LPUSH разворачивает порядок, поэтому раньше запланированные окажутся первыми
+            await self.redis.lpush(NOTIFICATIONS_KEY, *reversed(payloads))
+        return len(payloads)
+
+    async def notifications_queue_size(self):
+        """Размер очереди уведомлений вместе с отложенными."""
+        await self.ensure_connection()
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.llen(NOTIFICATIONS_KEY)
+            pipe.zcard(DELAYED_NOTIFICATIONS_KEY)
+            queued, delayed = await pipe.execute()
+        return queued + delayed
+
+    async def collect_metrics(self):
+        """Обновляет метрики Redis перед выдачей /metrics: задержку PING, глубину очереди и число активных запросов."""
+        await self.ensure_connection()
+        with REDIS_LATENCY.time(operation="ping"):
+            await self.redis.ping()
+        NOTIFICATIONS_QUEUE_DEPTH.set(await self.notifications_queue_size())
+        ACTIVE_REQUESTS.set(len(self.subscription_index))
+
     async def get_all_active_requests(self):
         """Возвращает все активные запросы."""
         await self.ensure_connection()
         try:
-            keys = await self.redis.keys("user_request:*")
+            keys = [key async for key in self.redis.sscan_iter(ACTIVE_REQUESTS_KEY, count=1000)]
             if not keys:
                 return []
 
-            async with self.redis.pipeline() as pipe:
-                for key in keys:
-                    pipe.hgetall(key)
-                active_requests = await pipe.execute()
+            active_requests = await self.hgetall_many(keys)
 
             return [req for req in active_requests if req.get('status_request') == 'True']
         except Exception as e:
             logger.error(f"Ошибка при получении активных запросов: {e}")
             return []
 
+    async def load_subscription_index(self):
+        """Загружает индекс подписок из активных запросов в Redis."""
+        self.subscription_index.rebuild(await self.get_all_active_requests())
+        return self.subscription_index
+
     async def is_notification_sent(self, message_id):
         """Проверяет, было ли уведомление с данным идентификатором отправлено недавно."""
         try:
-            return await self.redis.exists(f"notification_sent:{message_id}")
+            return await self.redis.exists(notification_key(message_id))
         except Exception as e:
             logger.error(f"Ошибка при проверке статуса уведомления в Redis: {e}")
             return False
 
+    async def claim_notifications(self, message_ids, delay=None):
+        """
+        Атомарно помечает пачку уведомлений как отправленные (SET NX EX в одном pipeline).
+
+        :param message_ids: Идентификаторы уведомлений или словарь {идентификатор: время жизни пометки}
+        :param delay: Время жизни пометки, если передан не словарь
+        :return: Множество идентификаторов, которые еще не отправлялись и теперь закреплены за вызывающим
+        """
+        ttls = message_ids if isinstance(message_ids, dict) else dict.fromkeys(message_ids, delay)
+        if not ttls:
+            return set()
+
+        message_ids = list(ttls)
+        await self.ensure_connection()
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for message_id in message_ids:
+                    pipe.set(notification_key(message_id), 1, ex=ttls[message_id], nx=True)
+                with REDIS_LATENCY.time(operation="claim_notifications"):
+                    results = await pipe.execute()
+            return {message_id for message_id, result in zip(message_ids, results) if result}
+        except Exception as e:
+            logger.error(f"Ошибка при пакетной проверке статуса уведомлений в Redis: {e}")
+            return set()
+
+    async def release_notifications(self, message_ids):
+        """Снимает пометки об отправке с уведомлений, которые в итоге не были отправлены."""
+        message_ids = list(message_ids)
+        if not message_ids:
+            return
+        try:
+            await self.redis.delete(*(notification_key(message_id) for message_id in message_ids))
+        except Exception as e:
+            logger.error(f"Ошибка при снятии пометок об отправке уведомлений в Redis: {e}")
+
+    async def get_notified_coefficients(self, slots):
+        """
+        Возвращает последние отправленные коэффициенты (в сотых) для пар (request_id, ключ слота).
+
+        :return: Список значений в том же порядке, None для слотов без истории
+        """
+        slots = list(slots)
+        if not slots:
+            return []
+
+        await self.ensure_connection()
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for request_id, slot in slots:
+                    pipe.hget(notify_state_key(request_id), slot)
+                results = await pipe.execute()
+            return [int(value) if value is not None else None for value in results]
+        except Exception as e:
+            logger.error(f"Ошибка при получении истории уведомлений из Redis: {e}")
+            return [None] * len(slots)
+
+    async def set_notified_coefficients(self, values, ttl):
+        """Запоминает отправленные коэффициенты: values - список (request_id, ключ слота, коэффициент в сотых)."""
+        values = list(values)
+        if not values:
+            return
+
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for request_id, slot, coefficient in values:
+                    pipe.hset(notify_state_key(request_id), slot, coefficient)
+                for request_id in {request_id for request_id, _, _ in values}:
+                    pipe.expire(notify_state_key(request_id), ttl)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении истории уведомлений в Redis: {e}")
+
+    async def clear_notified_coefficients(self, slots):
+        """Забывает отправленные коэффициенты для пар (request_id, ключ слота), например после закрытия слота."""
+        slots = list(slots)
+        if not slots:
+            return
+
+        await self.ensure_connection()
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for request_id, slot in slots:
+                    pipe.hdel(notify_state_key(request_id), slot)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Ошибка при очистке истории уведомлений в Redis: {e}")
+
     async def mark_notification_as_sent(self, message_id, delay):
         """Помечает уведомление как отправленное с указанным временем жизни."""
         try:
-            await self.redis.set(f"notification_sent:{message_id}", 1, ex=delay)
+            await self.redis.set(notification_key(message_id), 1, ex=delay)
         except Exception as e:
             logger.error(f"Ошибка при сохранении статуса уведомления в Redis: {e}")
\ No newline at end of file
@@ -0,0 +1,100 @@
+import time
+from datetime import datetime
+
+from loguru import logger
+from peewee import fn
+
+from database import postgre_base
+from database.models import Subscription, run_db
+from utils.datefunc import local_tz
+
+SUBSCRIPTIONS_KEY = "subscriptions:active_until"
+
+
+def to_timestamp(value):
+    """Переводит дату окончания подписки (наивное локальное время из БД или aware) в unix timestamp."""
+    if value.tzinfo is None:
+        value = local_tz.localize(value)
+    return value.timestamp()
+
+
+def load_active_subscriptions():
+    """Возвращает окончание действующих подписок по пользователям одним запросом."""
+    query = (Subscription
+             .select(Subscription.user, fn.MAX(Subscription.end_date))
+             .where(Subscription.is_active == True)
+             .group_by(Subscription.user)
+             .tuples())
+    return {user_id: to_timestamp(end_date) for user_id, end_date in query}
+
+
+class SubscriptionCache:
+    """
+    Кэш статуса подписок: user_id -> окончание подписки (unix timestamp).
+
+    Источник истины — Postgres, кэш заполняется целиком при старте, обновляется при выдаче подписки
+    и очищается задачей истечения подписок. Проверки в обработчиках и в мониторинге читают только память
+    процесса, копия в Redis позволяет подняться без Postgres.
+    """
+
+    def __init__(self, redis_client):
+        self.redis_client = redis_client
+        self.active_until = {}
+
+    async def load(self):
+        """Загружает действующие подписки из Postgres и переписывает копию в Redis."""
+        await self.redis_client.ensure_connection()
+        redis = self.redis_client.redis
+        try:
+            active_until = await run_db(load_active_subscriptions)
+        except Exception as e:
+            logger.error(f"Не удалось загрузить подписки из Postgres, используется копия из Redis: {e}")
+            cached = await redis.hgetall(SUBSCRIPTIONS_KEY)
+            self.active_until = {int(user_id): float(until) for user_id, until in cached.items()}
+            return self.active_until
+
+        async with redis.pipeline() as pipe:
+            pipe.delete(SUBSCRIPTIONS_KEY)
+            if active_until:
+                pipe.hset(SUBSCRIPTIONS_KEY, mapping=active_until)
+            await pipe.execute()
+        self.active_until = active_until
+        logger.info(f"Кэш подписок загружен: {len(active_until)} действующих подписок.")
+        return self.active_until
+
+    def is_active(self, user_id, now=None):
+        """Проверяет, оплачена ли подписка пользователя на текущий момент."""
+        until = self.active_until.get(int(user_id))
+        return until is not None and until > (time.time() if now is None else now)
+
+    def get_end_date(self, user_id):
+        """Возвращает окончание действующей подписки в локальном времени или None."""
+        if not self.is_active(user_id):
+            return None
+        return datetime.fromtimestamp(self.active_until[int(user_id)], local_tz)
+
+    async def set(self, user_id, end_date):
+        self.active_until[int(user_id)] = until = to_timestamp(end_date)
+        try:
+            await self.redis_client.redis.hset(SUBSCRIPTIONS_KEY, user_id, until)
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении подписки пользователя {user_id} в кэш Redis: {e}")
+
+    async def grant(self, user_id, sub_days):
+        """Выдает (продлевает) подписку в Postgres и сразу обновляет кэш."""
+        subscription = await postgre_base.grant_subscription(user_id, sub_days)
+        if subscription:
+            await self.set(user_id, subscription.end_date)
+        return subscription
+
+    async def invalidate(self, user_ids):
+        """Удаляет из кэша пользователей, подписки которых истекли."""
+        user_ids = [int(user_id) for user_id in user_ids]
+        if not user_ids:
+            return
+        for user_id in user_ids:
+            self.active_until.pop(user_id, None)
+        try:
+            await self.redis_client.redis.hdel(SUBSCRIPTIONS_KEY, *user_ids)
+        except Exception as e:
+            logger.error(f"Ошибка при очистке кэша подписок в Redis: {e}")
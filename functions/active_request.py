@@ -0,0 +1,88 @@
+from datetime import datetime
+
+REQUEST_DATE_FORMAT = '%d.%m.%Y %H:%M'
+
+# Политики повторных уведомлений по слоту
+NOTIFY_POLICY_CHANGE = "change"  # при появлении слота или входе коэффициента в диапазон
+NOTIFY_POLICY_REAPPEAR = "reappear"  # только когда слот исчез и появился снова
+NOTIFY_POLICY_IMPROVEMENT = "improvement"  # только когда коэффициент снизился относительно уже отправленного
+NOTIFY_POLICY_COOLDOWN = "cooldown"  # повторять, пока слот открыт, не чаще notify_cooldown секунд
+NOTIFY_POLICIES = (NOTIFY_POLICY_CHANGE, NOTIFY_POLICY_REAPPEAR, NOTIFY_POLICY_IMPROVEMENT, NOTIFY_POLICY_COOLDOWN)
+
+
+class ActiveRequest:
+    """Активный запрос пользователя, разобранный один раз при загрузке из Redis."""
+
+    __slots__ = ("request_id", "user_id", "warehouse_ids", "box_type_ids", "max_coefficient",
+                 "start_date", "end_date", "notify_until_first", "notify_policy", "notify_cooldown",
+                 "first_day", "last_day")
+
+    def __init__(self, request_id, user_id, warehouse_ids, box_type_ids, max_coefficient,
+                 start_date=None, end_date=None, notify_until_first=False,
+                 notify_policy=NOTIFY_POLICY_CHANGE, notify_cooldown=0):
+        self.request_id = request_id
+        self.user_id = user_id
+        self.warehouse_ids = warehouse_ids
+        self.box_type_ids = box_type_ids
+        self.max_coefficient = max_coefficient
+        self.start_date = start_date
+        self.end_date = end_date
+        self.notify_until_first = notify_until_first
+        self.notify_policy = notify_policy if notify_policy in NOTIFY_POLICIES else NOTIFY_POLICY_CHANGE
+        self.notify_cooldown = notify_cooldown
+        # Границы окна дат в формате ISO, чтобы сравнивать с датой слота без разбора строк
+        self.first_day = start_date.strftime('%Y-%m-%d') if start_date else None
+        self.last_day = end_date.strftime('%Y-%m-%d') if end_date else None
+
+    def __repr__(self):
+        return f"ActiveRequest({self.request_id}, user={self.user_id})"
+
+    @classmethod
+    def from_redis(cls, request_data):
+        """Создает запрос из хэша user_request:* в Redis."""
+        try:
+            max_coefficient = float(request_data.get('coefficient') or 0)
+        except ValueError:
+            max_coefficient = 0.0
+
+        return cls(
+            request_id=request_data['request_id'],
+            user_id=int(request_data['user_id']),
+            warehouse_ids=cls.parse_ids(request_data.get('warehouse_ids')),
+            box_type_ids=cls.parse_ids(request_data.get('boxTypeID')),
+            max_coefficient=max_coefficient,
+            start_date=cls.parse_date(request_data.get('start_date')),
+            end_date=cls.parse_date(request_data.get('end_date')),
+            notify_until_first=str(request_data.get('notify_until_first', 'False')).lower() == 'true',
+            notify_policy=request_data.get('notify_policy') or NOTIFY_POLICY_CHANGE,
+            notify_cooldown=int(request_data.get('notify_cooldown') or 0),
+        )
+
+    @staticmethod
+    def parse_ids(value):
+        """Разбирает строку идентификаторов через запятую, пропуская нечисловые значения."""
+        return frozenset(int(item) for item in str(value or '').split(',') if item.strip().isdigit())
+
+    @staticmethod
+    def parse_date(value):
+        try:
+            return datetime.strptime(value, REQUEST_DATE_FORMAT)
+        except (TypeError, ValueError):
+            return None
+
+    def accepts_day(self, slot_day):
+        """Проверяет, попадает ли дата слота (YYYY-MM-DD) в окно дат запроса."""
+        if self.first_day and slot_day < self.first_day:
+            return False
+        if self.last_day and slot_day > self.last_day:
+            return False
+        return True
+
+    def is_expired(self, now):
+        return self.end_date is not None and self.end_date < now
+
+    def keys(self):
+        """Возвращает ключи (warehouseID, boxTypeID), по которым запрос попадает в индекс."""
+        return [(warehouse_id, box_type_id)
+                for warehouse_id in self.warehouse_ids
+                for box_type_id in self.box_type_ids]
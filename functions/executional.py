@@ -1,5 +1,8 @@
+from loguru import logger
+from peewee import fn, SQL
+
 from data import texts
-from database.models import User, Subscription
+from database.models import User, Subscription, run_db
 from loader import config
 from utils.datefunc import normalized_local_now
 
@@ -31,21 +34,42 @@ def get_supply_name(boxTypeID):
     return ', '.join(supply_names)
 
 
-def check_subscriptions():
+def deactivate_expired_subscriptions():
+    """
+    Деактивирует истекшие подписки одним UPDATE ... RETURNING.
+
+    :return: ID пользователей, у которых после этого не осталось действующей подписки
+    """
     now = normalized_local_now()
+    Active = Subscription.alias()
+    has_active = fn.EXISTS(Active
+                           .select(SQL('1'))
+                           .where((Active.user == Subscription.user) &
+                                  (Active.is_active == True) &
+                                  (Active.end_date > now)))
+
+    query = (Subscription
+             .update(is_active=False)
+             .where((Subscription.end_date <= now) &
+                    (Subscription.is_active == True))
+             .returning(Subscription.user, has_active)
+             .tuples())
+
+    return {user_id for user_id, still_active in query.execute() if not still_active}
 
-    expired_subscriptions = Subscription.select().where(
-        (Subscription.end_date <= now) &
-        (Subscription.is_active == True)
-    )
 
-    if expired_subscriptions.exists():
-        for subscription in expired_subscriptions:
+async def check_subscriptions(redis_client, subscription_cache):
+    """Снимает истекшие подписки вне цикла событий, очищает кэш подписок и останавливает запросы владельцев в Redis."""
+    try:
+        user_ids = await run_db(deactivate_expired_subscriptions)
+    except Exception as e:
+        logger.error(f"Ошибка при деактивации истекших подписок: {e}")
+        return
 
-            subscription.is_active = False
-            subscription.save()
-    else:
-        return True
+    if user_ids:
+        logger.info(f"Истекли подписки пользователей: {len(user_ids)}.")
+        await subscription_cache.invalidate(user_ids)
+        await redis_client.stop_users_requests(user_ids)
 
 
 def is_admin(user_id: int) -> bool:
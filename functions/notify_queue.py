@@ -0,0 +1,118 @@
+import asyncio
+import time
+
+from aiogram import Bot
+from aiogram.utils.exceptions import RetryAfter, BotBlocked, ChatNotFound, UserDeactivated, CantInitiateConversation
+from loguru import logger
+
+from database.redis_base import RedisClient
+from functions.rate_limiter import TokenBucket
+from utils.metrics import TELEGRAM_SENT, TELEGRAM_ERRORS
+
+
+class NotificationDispatcher:
+    """Отправляет уведомления из очереди Redis с учетом лимитов Telegram."""
+
+    def __init__(self, bot: Bot, redis_client: RedisClient, workers=4, global_rate=25, per_chat_interval=1.0,
+                 global_burst=3, promote_interval=0.2):
+        self.bot = bot
+        self.redis_client = redis_client
+        self.workers = workers
+        self.per_chat_interval = per_chat_interval
+        self.promote_interval = promote_interval
+        # Общий лимит Telegram ~30 сообщений в секунду, оставляем запас.
+        # Всплеск держим маленьким: после простоя за первую секунду уходит не больше global_burst + global_rate
+        self.global_bucket = TokenBucket(capacity=min(global_burst, global_rate), refill_period=1 / global_rate)
+        self.chat_next_send = {}  # chat_id -> unix время, раньше которого нельзя писать в чат
+        self.paused_until = 0.0
+        self.tasks = []
+
+    def start(self):
+        """Запускает воркеры отправки и перенос отложенных уведомлений в очередь."""
+        if self.tasks:
+            return
+        self.tasks = [asyncio.ensure_future(self.worker(number)) for number in range(self.workers)]
+        self.tasks.append(asyncio.ensure_future(self.promoter()))
+        logger.info(f"Запущено воркеров отправки уведомлений: {self.workers}.")
+
+    async def stop(self):
+        """Останавливает воркеры отправки."""
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        logger.info("Воркеры отправки уведомлений остановлены.")
+
+    async def worker(self, number):
+        while True:
+            try:
+                notification = await self.redis_client.pop_notify(timeout=1)
+                if notification:
+                    await self.deliver(notification)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка в воркере отправки уведомлений #{number}: {e}")
+                await asyncio.sleep(1)
+
+    async def promoter(self):
+        """Возвращает в очередь отложенные уведомления, у которых подошло время отправки."""
+        while True:
+            try:
+                await self.redis_client.promote_notify()
+                await asyncio.sleep(self.promote_interval)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка при переносе отложенных уведомлений: {e}")
+                await asyncio.sleep(1)
+
+    async def wait_global_slot(self):
+        while True:
+            now = time.monotonic()
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            if self.global_bucket.try_acquire(now):
+                return
+            await asyncio.sleep(self.global_bucket.wait_time(now))
+
+    def reserve_chat_slot(self, chat_id):
+        """Резервирует ближайшее окно отправки в чат и возвращает его время (unix timestamp)."""
+        now = time.time()
+        send_at = max(now, self.chat_next_send.get(chat_id, 0.0))
+        self.chat_next_send[chat_id] = send_at + self.per_chat_interval
+
+        if len(self.chat_next_send) > 10000:
+            self.chat_next_send = {chat: ts for chat, ts in self.chat_next_send.items() if ts > now}
+        return send_at
+
+    async def deliver(self, notification):
+        user_id = notification["user_id"]
+
+        # Отложенное уведомление уже получило свое окно; остальные резервируют его сейчас.
+        # Если чат еще не готов, уведомление уходит в отложенную очередь, а воркер берет следующее
+        if not notification.get("send_at"):
+            send_at = self.reserve_chat_slot(user_id)
+            if send_at > time.time():
+                await self.redis_client.defer_notify(notification, send_at)
+                return
+
+        await self.wait_global_slot()
+
+        try:
+            await self.bot.send_message(user_id, notification["text"], reply_markup=notification.get("reply_markup"))
+            TELEGRAM_SENT.inc()
+            logger.info(f"Уведомление отправлено пользователю {user_id}.")
+        except RetryAfter as e:
+            TELEGRAM_ERRORS.inc(error=type(e).__name__)
+            logger.warning(f"Flood control Telegram: пауза {e.timeout} сек., уведомление возвращено в очередь.")
+            self.paused_until = max(self.paused_until, time.monotonic() + e.timeout)
+            await self.redis_client.requeue_notify(notification)
+        except (BotBlocked, ChatNotFound, UserDeactivated, CantInitiateConversation) as e:
+            TELEGRAM_ERRORS.inc(error=type(e).__name__)
+            logger.warning(f"Пользователь {user_id} недоступен ({e}), его запросы деактивированы.")
+            await self.redis_client.stop_user_requests(user_id)
+        except Exception as e:
+            TELEGRAM_ERRORS.inc(error=type(e).__name__)
+            logger.error(f"Ошибка при отправке уведомления пользователю {user_id}: {e}")
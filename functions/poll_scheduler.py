@@ -0,0 +1,137 @@
+import math
+import time
+
+from loguru import logger
+
+
+class PollScheduler:
+    """
+    Планирует опрос складов в пределах бюджета API ключей.
+
+    Период тика выводится из устойчивого бюджета запросов ключей, за тик тратится не больше
+    бюджета тика. Бюджет делится между складами по весу: число активных подписчиков склада,
+    умноженное на его недавнюю изменчивость (доля опросов, в которых менялись слоты). Популярные
+    и «живые» склады опрашиваются чаще, тихие хвостовые — реже, вплоть до max_interval.
+    """
+
+    def __init__(self, requests_per_second, chunk_size=100, min_interval=5, max_interval=60, smoothing=0.3,
+                 quiet_weight=0.05, utilization=0.8):
+        self.requests_per_second = requests_per_second
+        self.chunk_size = chunk_size  # Складов в одном запросе к API
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.smoothing = smoothing  # Коэффициент сглаживания изменчивости
+        self.quiet_weight = quiet_weight  # Минимальный вес изменчивости, чтобы тихие склады не выпадали из опроса
+        self.utilization = utilization  # Доля бюджета ключей, которую разрешено тратить на опрос
+        self.subscribers = {}  # warehouse_id -> число активных запросов
+        self.volatility = {}  # warehouse_id -> сглаженная доля опросов с изменениями
+        self.intervals = {}  # warehouse_id -> текущий интервал опроса в секундах
+        self.next_poll = {}  # warehouse_id -> момент следующего опроса (time.monotonic)
+        self.credit = 0.0  # Накопленный бюджет запросов: дробная часть бюджета тика переходит в следующие тики
+
+    @property
+    def budget(self):
+        """Устойчивое число запросов к API в секунду, которое можно тратить на опрос."""
+        return max(self.requests_per_second * self.utilization, 1e-6)
+
+    @property
+    def tick_interval(self):
+        """Период тика: не меньше min_interval и не меньше времени накопления одного запроса в бюджете."""
+        return min(self.max_interval, max(self.min_interval, 1 / self.budget))
+
+    @property
+    def requests_per_tick(self):
+        """Средний бюджет тика в запросах; может быть дробным, остаток копится в credit."""
+        return self.budget * self.tick_interval
+
+    def take_requests(self, wanted):
+        """
+        Списывает из накопленного бюджета запросы на wanted складов и возвращает число доступных запросов.
+
+        Неизрасходованные целые запросы копятся не больше чем на один тик вперед, чтобы не было всплесков.
+        """
+        per_tick = self.requests_per_tick
+        self.credit = min(self.credit + per_tick, per_tick + 1)
+        available = int(self.credit + 1e-9)
+        requests = min(available, math.ceil(wanted / self.chunk_size))
+        self.credit = max(0.0, self.credit - requests)
+        return requests
+
+    def weight(self, warehouse_id):
+        """Вес склада: подписчики × (изменчивость + минимальный вес). Еще не опрошенные склады считаются изменчивыми."""
+        return self.subscribers.get(warehouse_id, 0) * (self.volatility.get(warehouse_id, 1.0) + self.quiet_weight)
+
+    def due(self, subscribers, urgent=(), now=None):
+        """
+        Возвращает склады, которые пора опросить в этом тике, в пределах бюджета тика.
+
+        :param subscribers: Число активных запросов по каждому складу
+        :param urgent: Склады, которые нужно опросить вне очереди (например, из еще не сверенных запросов)
+
+        Просроченные склады упорядочены по просрочке, умноженной на корень из веса, поэтому при нехватке
+        бюджета первыми опрашиваются популярные склады. Не поместившиеся склады остаются на следующий тик.
+        """
+        now = time.monotonic() if now is None else now
+        self.subscribers = dict(subscribers)
+
+        for warehouse_id in [warehouse_id for warehouse_id in self.next_poll if warehouse_id not in self.subscribers]:
+            self.forget(warehouse_id)
+        new_ids = self.subscribers.keys() - self.next_poll.keys()
+        for warehouse_id in new_ids:
+            self.next_poll[warehouse_id] = now
+        if new_ids:
+            self.update_intervals()
+
+        urgent = self.subscribers.keys() & set(urgent)
+
+        def priority(warehouse_id):
+            overdue = now - self.next_poll[warehouse_id] + self.tick_interval
+            return warehouse_id not in urgent, -overdue * math.sqrt(self.weight(warehouse_id))
+
+        due = sorted(
+            (warehouse_id for warehouse_id in self.subscribers
+             if warehouse_id in urgent or self.next_poll[warehouse_id] <= now),
+            key=priority
+        )
+        return due[:self.take_requests(len(due)) * self.chunk_size]
+
+    def record(self, fetched_ids, changed_ids, now=None):
+        """Обновляет изменчивость опрошенных складов и назначает им следующий опрос."""
+        now = time.monotonic() if now is None else now
+
+        fetched_ids = [warehouse_id for warehouse_id in fetched_ids if warehouse_id in self.next_poll]
+        for warehouse_id in fetched_ids:
+            changed = 1.0 if warehouse_id in changed_ids else 0.0
+            previous = self.volatility.get(warehouse_id, 1.0)
+            self.volatility[warehouse_id] = previous + (changed - previous) * self.smoothing
+
+        self.update_intervals()
+        for warehouse_id in fetched_ids:
+            self.next_poll[warehouse_id] = now + self.intervals[warehouse_id]
+
+    def update_intervals(self):
+        """
+        Распределяет бюджет опроса между складами пропорционально корню из веса.
+
+        Такое распределение минимизирует среднюю задержку обнаружения изменений, взвешенную по подписчикам,
+        при фиксированном числе запросов к API.
+        """
+        roots = {warehouse_id: math.sqrt(self.weight(warehouse_id)) for warehouse_id in self.subscribers}
+        total = sum(roots.values())
+        if not total:
+            return
+
+        capacity = self.budget * self.chunk_size  # Складов в секунду
+        for warehouse_id, root in roots.items():
+            rate = capacity * root / total
+            interval = 1 / rate if rate > 0 else self.max_interval
+            self.intervals[warehouse_id] = min(self.max_interval, max(self.tick_interval, interval))
+
+        logger.debug(f"Планировщик опроса: {len(self.intervals)} складов, интервалы от "
+                     f"{min(self.intervals.values()):.1f} до {max(self.intervals.values()):.1f} сек.")
+
+    def forget(self, warehouse_id):
+        """Перестает отслеживать склад, на который не осталось подписок."""
+        self.volatility.pop(warehouse_id, None)
+        self.intervals.pop(warehouse_id, None)
+        self.next_poll.pop(warehouse_id, None)
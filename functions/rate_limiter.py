@@ -0,0 +1,96 @@
+import asyncio
+import time
+
+from loguru import logger
+
+
+class TokenBucket:
+    """Корзина токенов: capacity запросов всплеском и один новый токен каждые refill_period секунд."""
+
+    def __init__(self, capacity, refill_period):
+        self.capacity = capacity
+        self.refill_period = refill_period
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def refill(self, now):
+        elapsed = now - self.updated
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed / self.refill_period)
+            self.updated = now
+
+    def try_acquire(self, now):
+        """Забирает токен, если он доступен и ключ не находится в cooldown."""
+        if now < self.blocked_until:
+            return False
+        self.refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self, now):
+        """Возвращает время в секундах до появления следующего токена."""
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self.refill(now)
+        return max(0.0, (1 - self.tokens) * self.refill_period)
+
+    def cooldown(self, seconds):
+        """Блокирует корзину на заданное время и обнуляет накопленные токены."""
+        now = time.monotonic()
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        self.tokens = 0.0
+        self.updated = self.blocked_until
+
+    def sync_remaining(self, remaining):
+        """Подстраивает число токенов под остаток, который сообщил сервер."""
+        self.refill(time.monotonic())
+        self.tokens = min(self.tokens, float(remaining))
+
+
+class KeyPool:
+    """Пул API ключей, у каждого ключа своя корзина токенов."""
+
+    def __init__(self, keys, capacity=6, refill_period=10):
+        self.buckets = {key: TokenBucket(capacity, refill_period) for key in keys}
+        # Ключи WB — JWT с одинаковым началом, поэтому в логах и метриках ключ обозначается номером в списке
+        self.labels = {key: f"key{number}" for number, key in enumerate(self.buckets)}
+
+    def __len__(self):
+        return len(self.buckets)
+
+    def label(self, key):
+        """Возвращает метку ключа для логов и метрик (key0, key1, ...)."""
+        return self.labels.get(key, "unknown")
+
+    @property
+    def requests_per_second(self):
+        """Суммарный устойчивый бюджет запросов в секунду по всем ключам."""
+        return sum(1 / bucket.refill_period for bucket in self.buckets.values())
+
+    async def acquire(self):
+        """Ожидает и возвращает ключ, у которого есть свободный токен (с наибольшим запасом)."""
+        while True:
+            now = time.monotonic()
+            for bucket in self.buckets.values():
+                bucket.refill(now)
+
+            for key, bucket in sorted(self.buckets.items(), key=lambda item: -item[1].tokens):
+                if bucket.try_acquire(now):
+                    return key
+
+            await asyncio.sleep(min(bucket.wait_time(now) for bucket in self.buckets.values()))
+
+    def cooldown(self, key, seconds):
+        """Отправляет ключ в cooldown после ответа 429."""
+        bucket = self.buckets.get(key)
+        if bucket:
+            bucket.cooldown(seconds)
+            logger.warning(f"Ключ {self.label(key)} отправлен в cooldown на {seconds:.1f} сек.")
+
+    def sync_remaining(self, key, remaining):
+        bucket = self.buckets.get(key)
+        if bucket:
+            bucket.sync_remaining(remaining)
@@ -0,0 +1,53 @@
+from loguru import logger
+
+
+class SnapshotDiff:
+    """Хранит предыдущий снимок коэффициентов и вычисляет изменения между тиками."""
+
+    def __init__(self):
+        self.previous = {}  # (warehouse_id, box_type_id, date) -> coefficient
+        self.changed_warehouse_ids = set()  # Склады, на которых в последнем обновлении изменились слоты
+        self.closed_slots = []  # Слоты, которые в последнем обновлении исчезли или стали недоступны (-1)
+
+    @staticmethod
+    def slot_key(entry):
+        """Возвращает ключ слота (warehouseID, boxTypeID, date) и его коэффициент."""
+        return (int(entry["warehouseID"]), int(entry["boxTypeID"]), entry["date"]), float(entry["coefficient"])
+
+    def update(self, data, warehouse_ids):
+        """
+        Сравнивает новый снимок с предыдущим и запоминает его.
+
+        :param data: Ответ API с коэффициентами
+        :param warehouse_ids: Склады, которые были успешно опрошены в этом тике
+        :return: Список пар (слот, предыдущий коэффициент или None) для появившихся и изменившихся слотов
+        """
+        current = {}
+        changes = []
+        closed = []
+
+        for entry in data:
+            try:
+                key, coefficient = self.slot_key(entry)
+            except (KeyError, TypeError, ValueError):
+                continue
+
+            current[key] = coefficient
+            previous = self.previous.get(key)
+            if previous != coefficient:
+                changes.append((entry, previous))
+                if coefficient < 0 and previous is not None and previous >= 0:
+                    closed.append(key)
+
+        disappeared = [key for key in self.previous if key[0] in warehouse_ids and key not in current]
+        for key in disappeared:
+            if self.previous[key] >= 0:
+                closed.append(key)
+            del self.previous[key]
+        self.closed_slots = closed
+        self.previous.update(current)
+        self.changed_warehouse_ids = {key[0] for key in disappeared}
+        self.changed_warehouse_ids.update(int(entry["warehouseID"]) for entry, _ in changes)
+
+        logger.debug(f"Изменения снимка: {len(changes)} изменено, {len(disappeared)} исчезло из {len(current)} слотов")
+        return changes
@@ -0,0 +1,134 @@
+from bisect import bisect_left, insort
+from collections import Counter
+from loguru import logger
+
+from functions.active_request import ActiveRequest, NOTIFY_POLICY_COOLDOWN
+
+
+class SubscriptionIndex:
+    """Обратный индекс подписок: (warehouseID, boxTypeID) -> запросы, отсортированные по коэффициенту."""
+
+    def __init__(self, track_cooldown=True):
+        self.buckets = {}  # (warehouse_id, box_type_id) -> [(max_coefficient, request_id), ...]
+        self.requests = {}  # request_id -> ActiveRequest
+        self.pending = {}  # request_id -> ActiveRequest, еще не сверенные с полным снимком
+        self.policies = Counter()  # notify_policy -> количество запросов
+        self.warehouse_subscribers = Counter()  # warehouse_id -> количество запросов
+        # Запросы с повтором по cooldown сверяются с полным снимком каждый тик, держим их отдельно
+        self.cooldown_index = SubscriptionIndex(track_cooldown=False) if track_cooldown else None
+        self.loaded = False
+
+    def __len__(self):
+        return len(self.requests)
+
+    def add(self, request):
+        """Добавляет (или обновляет) запрос в индексе. Принимает ActiveRequest или хэш из Redis."""
+        if not isinstance(request, ActiveRequest):
+            if not request.get('request_id'):
+                return
+            request = ActiveRequest.from_redis(request)
+
+        self.remove(request.request_id)
+
+        item = (request.max_coefficient, request.request_id)
+        for key in request.keys():
+            insort(self.buckets.setdefault(key, []), item)
+
+        self.requests[request.request_id] = request
+        self.policies[request.notify_policy] += 1
+        if request.box_type_ids:
+            self.warehouse_subscribers.update(request.warehouse_ids)
+        if self.cooldown_index is not None and request.notify_policy == NOTIFY_POLICY_COOLDOWN:
+            self.cooldown_index.add(request)
+        if self.loaded:
+            self.pending[request.request_id] = request
+
+    def remove(self, request_id):
+        """Удаляет запрос из индекса."""
+        self.pending.pop(request_id, None)
+        request = self.requests.pop(request_id, None)
+        if not request:
+            return
+
+        self.policies[request.notify_policy] -= 1
+        if request.box_type_ids:
+            for warehouse_id in request.warehouse_ids:
+                self.warehouse_subscribers[warehouse_id] -= 1
+                if not self.warehouse_subscribers[warehouse_id]:
+                    del self.warehouse_subscribers[warehouse_id]
+        if self.cooldown_index is not None and request.notify_policy == NOTIFY_POLICY_COOLDOWN:
+            self.cooldown_index.remove(request_id)
+
+        item = (request.max_coefficient, request_id)
+        for key in request.keys():
+            bucket = self.buckets.get(key)
+            if not bucket:
+                continue
+            position = bisect_left(bucket, item)
+            if position < len(bucket) and bucket[position] == item:
+                del bucket[position]
+            if not bucket:
+                del self.buckets[key]
+
+    def rebuild(self, requests):
+        """Полностью перестраивает индекс по списку активных запросов."""
+        self.buckets = {}
+        self.requests = {}
+        self.pending = {}
+        self.policies = Counter()
+        self.warehouse_subscribers = Counter()
+        if self.cooldown_index is not None:
+            self.cooldown_index = SubscriptionIndex(track_cooldown=False)
+        self.loaded = False
+        for request in requests:
+            self.add(request)
+        self.loaded = True
+        logger.info(f"Индекс подписок перестроен: {len(self.requests)} запросов, {len(self.buckets)} ключей.")
+
+    def subscribers(self, warehouse_id, box_type_id):
+        """Возвращает все запросы по складу и типу коробки независимо от коэффициента."""
+        return [self.requests[request_id] for _, request_id in self.buckets.get((warehouse_id, box_type_id), ())]
+
+    def match(self, warehouse_id, box_type_id, coefficient, previous=None):
+        """
+        Возвращает запросы, чей максимальный коэффициент не меньше коэффициента слота.
+
+        Если передан предыдущий коэффициент слота, возвращаются только запросы, для которых
+        слот вошел в допустимый диапазон (раньше не подходил, теперь подходит).
+        """
+        if coefficient < 0:
+            return []
+
+        bucket = self.buckets.get((warehouse_id, box_type_id))
+        if not bucket:
+            return []
+
+        start = bisect_left(bucket, (coefficient,))
+        end = bisect_left(bucket, (previous,)) if previous is not None and previous >= 0 else len(bucket)
+        return [self.requests[request_id] for _, request_id in bucket[start:end]]
+
+    def take_pending(self):
+        """Возвращает индекс новых запросов, еще не сверенных с полным снимком, и очищает очередь."""
+        pending_index = SubscriptionIndex(track_cooldown=False)
+        for request in self.pending.values():
+            pending_index.add(request)
+        self.pending = {}
+        return pending_index
+
+    def requeue_pending(self, pending_index, fetched_ids):
+        """Возвращает в очередь новые запросы, не все склады которых были опрошены в этом тике."""
+        for request_id, request in pending_index.requests.items():
+            if self.requests.get(request_id) is request and not request.warehouse_ids <= fetched_ids:
+                self.pending[request_id] = request
+
+    def pending_warehouse_ids(self):
+        """Возвращает склады запросов, еще не сверенных с текущим состоянием."""
+        return {warehouse_id for request in self.pending.values() for warehouse_id in request.warehouse_ids}
+
+    def has_policy(self, notify_policy):
+        """Проверяет, есть ли в индексе запросы с указанной политикой уведомлений."""
+        return self.policies[notify_policy] > 0
+
+    def warehouse_ids(self):
+        """Возвращает множество складов, на которые есть хотя бы одна подписка."""
+        return set(self.warehouse_subscribers)
@@ -1,157 +1,373 @@
 from loguru import logger
 from aiogram import Bot
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.events import EVENT_JOB_MAX_INSTANCES, EVENT_JOB_MISSED
 from functions.wb_api import ApiClient
 from database.redis_base import RedisClient
-import asyncio
+from functions.snapshot_diff import SnapshotDiff
+from functions.poll_scheduler import PollScheduler
+from functions.tick_stats import TickStats
+from functions.active_request import NOTIFY_POLICY_REAPPEAR, NOTIFY_POLICY_IMPROVEMENT, NOTIFY_POLICY_COOLDOWN
 from data import keyboards, texts
-from datetime import datetime
-import hashlib
+from datetime import datetime, date
+from loader import config
+from utils.datefunc import datetime_local_now
+import struct
+import time
+
+TELEGRAM_MESSAGE_LIMIT = 4096
+# Ключ дедупликации: user_id, warehouseID, boxTypeID, порядковый номер даты слота, коэффициент * 100
+DEDUP_KEY = struct.Struct(">QIHIh")
+# Ключ слота в истории уведомлений запроса: warehouseID, boxTypeID, порядковый номер даты слота
+SLOT_KEY = struct.Struct(">IHI")
+MONITOR_JOB_ID = "monitor_requests"
+NOTIFY_BATCH_USERS = 500  # Сколько пользователей формируется и ставится в очередь одной командой
 
 
 class NotificationService:
     def __init__(self, api_client: ApiClient, redis_client: RedisClient, bot: Bot, scheduler: AsyncIOScheduler,
-                 min_delay_between_requests=5):
+                 min_delay_between_requests=5, aggregate=None, subscription_cache=None):
         self.api_client = api_client
         self.redis_client = redis_client
         self.bot = bot
         self.scheduler = scheduler
         self.min_delay_between_requests = min_delay_between_requests
         self.notification_delay = 60
+        self.snapshot_diff = SnapshotDiff()
+        self.poll_scheduler = PollScheduler(api_client.key_pool.requests_per_second,
+                                            chunk_size=api_client.max_warehouses_per_request,
+                                            min_interval=min_delay_between_requests,
+                                            max_interval=config.poll_max_interval)
+        self.tick_stats = TickStats()
+        self.aggregate = config.notify_aggregate if aggregate is None else aggregate
+        self.subscription_cache = subscription_cache  # Если задан, пользователи без оплаченной подписки пропускаются
 
     async def monitor_requests(self):
         """Метод для периодического мониторинга активных запросов."""
+        self.tick_stats.start(self.poll_scheduler.tick_interval)
         try:
-            active_requests = await self.redis_client.get_all_active_requests()
-            if not active_requests:
-                logger.info("Активные запросы отсутствуют.")
-                return
-            else:
-                grouped_requests = self.group_requests_by_parameters(active_requests)
-                tasks = [self.process_grouped_requests(group) for group in grouped_requests]
-                await asyncio.gather(*tasks)
-                logger.info("Обработка активных запросов завершена.")
+            await self.poll()
         except Exception as e:
             logger.error(f"Ошибка в процессе мониторинга: {e}")
+        finally:
+            self.tick_stats.finish()
 
-    def start_scheduler(self):
-        """Запуск планировщика для фонового мониторинга запросов."""
-        self.scheduler.add_job(self.monitor_requests, 'interval', seconds=self.min_delay_between_requests,
-                               coalesce=True, max_instances=1)
-        self.scheduler.start()
+    async def poll(self):
+        """Опрашивает склады, чей интервал истек, и сверяет полученный снимок с подписками."""
+        index = self.redis_client.subscription_index
+        with self.tick_stats.stage("load"):
+            if not index.loaded:
+                await self.redis_client.load_subscription_index()
 
-    def group_requests_by_parameters(self, requests):
-        """Группирует запросы по общим параметрам, чтобы минимизировать количество запросов к API."""
-        groups = {}
-        for req in requests:
-            key = (req['warehouse_ids'], req['coefficient'], tuple(str(req.get('boxTypeID', '')).split(',')))
-            if key not in groups:
-                groups[key] = []
-            groups[key].append(req)
-        return groups.values()
-
-    async def process_grouped_requests(self, requests):
-        """Обрабатывает сгруппированные запросы, отправляя один запрос к API на группу."""
-        if not requests:
-            return
-
-        user_ids = [req['user_id'] for req in requests]
-
-        try:
-            logger.debug(f"Отправка запроса к API для пользователей {user_ids}")
-
-            warehouse_ids = list(set(
-                warehouse_id
-                for req in requests
-                for warehouse_id in self.safe_split(req['warehouse_ids'])
-            ))
-            data = await self.api_client.get_coefficient(warehouse_ids)
+            if not len(index):
+                logger.info("Активные запросы отсутствуют.")
+                return
 
-            if not data:
-                logger.warning(f"Не удалось получить данные от API для пользователей {user_ids}.")
+            # Опрашиваем только склады, чей интервал истек; склады новых запросов — вне очереди
+            warehouse_ids = self.poll_scheduler.due(index.warehouse_subscribers, urgent=index.pending_warehouse_ids())
+            if not warehouse_ids:
+                logger.debug("В этом тике нет складов для опроса.")
                 return
 
-            for request_data in requests:
-                await self.handle_api_response(request_data['user_id'], data, request_data)
+        # Опрос — самая дорогая стадия: ответы ждем только до дедлайна тика, а не опрошенные склады
+        # остаются просроченными в планировщике и опрашиваются в следующем тике
+        if self.tick_stats.expired():
+            self.tick_stats.carry(len(warehouse_ids))
+            logger.warning(f"Дедлайн тика истек до опроса: {len(warehouse_ids)} складов перенесены на следующий тик.")
+            return
 
-        except Exception as e:
-            logger.error(f"Ошибка при обработке запроса для пользователей {user_ids}: {e}")
-
-    async def handle_api_response(self, user_id, data, request_data):
-        """Обрабатывает ответ от API и отправляет уведомления пользователю."""
-        logger.debug('Ответ API получен')
-
-        selected_warehouses = set(self.safe_split(request_data["warehouse_ids"]))
-        selected_box_types = set(self.safe_split(request_data.get("boxTypeID", "")))
-        max_coefficient = float(request_data["coefficient"])
-
-        relevant_entries = sorted(
-            [
-                entry for entry in data
-                if str(entry.get("warehouseID")) in selected_warehouses
-                   and 0 <= float(entry.get("coefficient", -1)) <= max_coefficient
-                   and str(entry.get("boxTypeID", "")) in selected_box_types
-            ],
-            key=lambda x: (x["coefficient"], x["date"])
-        )
+        with self.tick_stats.stage("fetch"):
+            data, fetched_ids = await self.api_client.get_coefficients_snapshot(
+                warehouse_ids, timeout=self.tick_stats.remaining())
 
-        if not relevant_entries:
-            logger.info(f"Нет уведомлений для отправки пользователю {user_id}.")
+        if data is None:
+            logger.warning(f"Не удалось получить снимок коэффициентов для складов {warehouse_ids}.")
             return
 
-        logger.debug(f"Найдены данные для отправки уведомления пользователю {user_id}: {relevant_entries}")
-
-        for entry in relevant_entries:
-            await self.send_notification_if_needed(user_id, entry)
+        unfetched = len(set(warehouse_ids) - fetched_ids)
+        if unfetched:
+            self.tick_stats.carry(unfetched)
 
-    async def send_notification_if_needed(self, user_id, entry):
-        """Отправляет уведомление пользователю, если с последней отправки похожего уведомления прошло достаточное время."""
-        try:
-            # Генерируем сообщение
-            box_type_ids = self.safe_split(entry.get("boxTypeID", ""))
-            box_type_names = self.get_box_type_names(box_type_ids)
-            formatted_date = self.format_date(entry.get("date"))
-
-            coefficient = entry["coefficient"]
-            coefficient_text = f"{coefficient}" if int(coefficient) != 0 else "0"
-
-            message = texts.alert_text.format(
-                date=formatted_date,
-                warehouseName=await self.redis_client.get_warehouse_name(entry["warehouseID"]),
-                boxTypeName=", ".join(box_type_names) if box_type_names else "Неизвестный тип",
-                coefficient=coefficient_text
-            )
-
-            # Генерируем уникальный идентификатор сообщения на основе его содержимого
-            message_id = self.generate_message_id(user_id, message)
-
-            # Проверяем, было ли уже отправлено похожее сообщение недавно
-            if await self.is_similar_notification_recently_sent(message_id):
-                logger.info(f"Похожее уведомление уже отправлено пользователю {user_id}. Пропускаем.")
-                return
+        await self.process_requests(data, fetched_ids)
+        self.poll_scheduler.record(fetched_ids, self.snapshot_diff.changed_warehouse_ids)
+        logger.info("Обработка активных запросов завершена.")
 
-            # Отправляем уведомление
-            await self.bot.send_message(user_id, message, reply_markup=keyboards.go_booking())
-            logger.info(f"Уведомление отправлено пользователю {user_id}.")
+    def start_scheduler(self):
+        """Запуск планировщика для фонового мониторинга запросов."""
+        tick_interval = self.poll_scheduler.tick_interval
+        self.scheduler.add_job(self.monitor_requests, 'interval', seconds=tick_interval, id=MONITOR_JOB_ID,
+                               coalesce=True, max_instances=1)
+        self.scheduler.add_listener(self.on_tick_skipped, EVENT_JOB_MAX_INSTANCES | EVENT_JOB_MISSED)
+        self.scheduler.start()
+        logger.info(f"Мониторинг запросов запущен с периодом тика {tick_interval:.1f} сек.")
+
+    def on_tick_skipped(self, event):
+        """Учитывает запуски мониторинга, пропущенные планировщиком, пока предыдущий тик еще выполнялся."""
+        if event.job_id == MONITOR_JOB_ID:
+            self.tick_stats.skip()
+            logger.warning(f"Тик мониторинга пропущен: предыдущий еще выполняется (всего пропусков {self.tick_stats.skipped}).")
+
+    def match_entries(self, changes, pending_index, data):
+        """
+        Сопоставляет слоты с подписками.
+
+        Изменившиеся слоты сверяются со всеми подписками, а полный снимок — только с новыми запросами,
+        которые еще не видели текущего состояния складов, и с запросами с повтором по cooldown.
+        Слоты вне окна дат запроса, истекшие запросы и запросы пользователей без оплаченной подписки
+        пропускаются. Запросы «только при повторном
+        появлении» получают лишь появившиеся слоты, а запросы «только при снижении» дополнительно
+        получают слоты, коэффициент которых снизился внутри их диапазона.
+        """
+        index = self.redis_client.subscription_index
+        now = datetime_local_now()
+        timestamp = time.time()
+        cache = self.subscription_cache
+        matches = {}
+        seen = set()
+
+        def collect(entry, request_list):
+            slot_day = str(entry.get("date", ""))[:10]
+            for request in request_list:
+                if (request.request_id, id(entry)) in seen:
+                    continue
+                if request.is_expired(now) or not request.accepts_day(slot_day):
+                    continue
+                if cache is not None and not cache.is_active(request.user_id, timestamp):
+                    continue
+                seen.add((request.request_id, id(entry)))
+                matches.setdefault(request.request_id, (request, []))[1].append(entry)
+
+        track_improvement = index.has_policy(NOTIFY_POLICY_IMPROVEMENT)
+        for entry, previous in changes:
+            (warehouse_id, box_type_id, _), coefficient = self.snapshot_diff.slot_key(entry)
+            appeared = previous is None or previous < 0
+            collect(entry, [request for request in index.match(warehouse_id, box_type_id, coefficient, previous)
+                            if appeared or request.notify_policy != NOTIFY_POLICY_REAPPEAR])
+
+            if track_improvement and not appeared and coefficient < previous:
+                collect(entry, [request for request in index.match(warehouse_id, box_type_id, coefficient)
+                                if request.notify_policy == NOTIFY_POLICY_IMPROVEMENT])
+
+        full_indexes = [full_index for full_index in (pending_index, index.cooldown_index) if len(full_index)]
+        if full_indexes:
+            for entry in data:
+                try:
+                    (warehouse_id, box_type_id, _), coefficient = self.snapshot_diff.slot_key(entry)
+                except (KeyError, TypeError, ValueError):
+                    continue
+                for full_index in full_indexes:
+                    collect(entry, full_index.match(warehouse_id, box_type_id, coefficient))
+
+        return matches.values()
+
+    async def process_requests(self, data, fetched_ids):
+        """Сверяет изменения снимка с подписками и ставит уведомления в очередь на формирование."""
+        index = self.redis_client.subscription_index
+        with self.tick_stats.stage("match"):
+            changes = self.snapshot_diff.update(data, fetched_ids)
+            pending_index = index.take_pending()
+
+            candidates = []
+            for request, entries in self.match_entries(changes, pending_index, data):
+                try:
+                    candidates.append((request, self.prepare_alerts(request, entries)))
+                except Exception as e:
+                    logger.error(f"Ошибка при подготовке уведомлений пользователю {request.user_id}: {e}")
+
+            # Новые запросы, часть складов которых еще не опрошена, досверяются в следующих тиках
+            index.requeue_pending(pending_index, fetched_ids)
+
+        with self.tick_stats.stage("dedup"):
+            await self.forget_closed_slots()
+            user_alerts = await self.deduplicate(candidates)
+
+        with self.tick_stats.stage("enqueue"):
+            await self.enqueue_notifications(user_alerts)
+
+    async def deduplicate(self, candidates):
+        """
+        Отбирает еще не отправленные уведомления.
+
+        :return: Словарь user_id -> [(ключ дедупликации, слот), ...] со слотами, закрепленными в этом тике
+        """
+        candidates = await self.filter_improvements(candidates)
+        if not candidates:
+            return {}
+
+        # Проверка и пометка всех уведомлений тика за один запрос к Redis, окно дедупликации — по политике запроса
+        windows = {}
+        for request, alerts in candidates:
+            window = self.dedup_window(request)
+            for message_id, _ in alerts:
+                windows[message_id] = max(windows.get(message_id, 0), window)
+        claimed = await self.redis_client.claim_notifications(windows)
+
+        # Запросы «до первого уведомления» завершаются одной транзакцией; уведомляют только те, что завершил этот тик
+        completed = await self.redis_client.complete_requests(
+            (request.user_id, request.request_id) for request, alerts in candidates
+            if request.notify_until_first and any(message_id in claimed for message_id, _ in alerts)
+        )
 
-            # Помечаем уведомление как отправленное
-            await self.mark_notification_as_sent(message_id)
+        user_alerts = {}
+        used = set()
+        notified = []
+        for request, alerts in candidates:
+            request_alerts = [alert for alert in alerts if alert[0] in claimed and alert[0] not in used]
+            if not request_alerts:
+                continue
+
+            if request.notify_until_first:
+                if request.request_id not in completed:
+                    continue
+                request_alerts = request_alerts[:1]
+                logger.info(f"Запрос {request.request_id} пользователя {request.user_id} завершен после первого уведомления.")
+
+            used.update(message_id for message_id, _ in request_alerts)
+            user_alerts.setdefault(request.user_id, []).extend(request_alerts)
+            if request.notify_policy == NOTIFY_POLICY_IMPROVEMENT:
+                notified.extend((request.request_id, *self.slot_state(entry)) for _, entry in request_alerts)
+
+        # Снимаем пометки со слотов, которые были заняты, но так и не попали в уведомления
+        await self.redis_client.release_notifications(claimed - used)
+        await self.redis_client.set_notified_coefficients(notified, config.notify_state_days * 86400)
+        return user_alerts
+
+    async def enqueue_notifications(self, user_alerts):
+        """
+        Формирует уведомления и ставит их в очередь отправки пачками по NOTIFY_BATCH_USERS пользователей.
+
+        Все слоты, закрепленные в тике, отправляются в том же тике, пока действуют их пометки об отправке:
+        формирование текста идет в памяти и дешево, поэтому дедлайн тика здесь не проверяется.
+        """
+        items = list(user_alerts.items())
+        for start in range(0, len(items), NOTIFY_BATCH_USERS):
+            notifications = []
+            for user_id, alerts in items[start:start + NOTIFY_BATCH_USERS]:
+                try:
+                    notifications.extend(await self.build_notifications(user_id, [entry for _, entry in alerts]))
+                except Exception as e:
+                    logger.error(f"Ошибка при подготовке уведомлений пользователю {user_id}: {e}")
+            await self.redis_client.add_notify_many(notifications)
+
+    def dedup_window(self, request):
+        """Возвращает время жизни пометки об отправке для запроса с учетом его политики."""
+        if request.notify_policy == NOTIFY_POLICY_COOLDOWN:
+            return max(self.notification_delay, request.notify_cooldown)
+        return self.notification_delay
+
+    async def forget_closed_slots(self):
+        """
+        Сбрасывает историю запросов «только при снижении» по закрывшимся слотам,
+        чтобы повторно открывшийся слот сравнивался не со старым коэффициентом, а уведомлялся заново.
+        """
+        index = self.redis_client.subscription_index
+        if not index.has_policy(NOTIFY_POLICY_IMPROVEMENT):
+            return
 
-        except Exception as e:
-            logger.error(f"Ошибка при отправке уведомления пользователю {user_id}: {e}")
+        slots = []
+        for warehouse_id, box_type_id, slot_date in self.snapshot_diff.closed_slots:
+            requests = [request for request in index.subscribers(warehouse_id, box_type_id)
+                        if request.notify_policy == NOTIFY_POLICY_IMPROVEMENT]
+            if not requests:
+                continue
+            slot = SLOT_KEY.pack(warehouse_id, box_type_id, date.fromisoformat(slot_date[:10]).toordinal())
+            slots.extend((request.request_id, slot) for request in requests)
+        await self.redis_client.clear_notified_coefficients(slots)
+
+    async def filter_improvements(self, candidates):
+        """
+        Отбрасывает у запросов «только при снижении» слоты, по которым уже был отправлен
+        такой же или более низкий коэффициент. История читается из Redis одним pipeline.
+        """
+        slots = [(request.request_id, message_id, *self.slot_state(entry))
+                 for request, alerts in candidates if request.notify_policy == NOTIFY_POLICY_IMPROVEMENT
+                 for message_id, entry in alerts]
+        if not slots:
+            return candidates
+
+        notified = await self.redis_client.get_notified_coefficients((request_id, slot) for request_id, _, slot, _ in slots)
+        rejected = {(request_id, message_id)
+                    for (request_id, message_id, _, coefficient), last in zip(slots, notified)
+                    if last is not None and coefficient >= last}
+
+        filtered = []
+        for request, alerts in candidates:
+            alerts = [alert for alert in alerts if (request.request_id, alert[0]) not in rejected]
+            if alerts:
+                filtered.append((request, alerts))
+        return filtered
+
+    def prepare_alerts(self, request, entries):
+        """Возвращает кандидатов на уведомление (ключ дедупликации, слот) без форматирования текста."""
+        return [
+            (self.generate_message_id(request.user_id, entry), entry)
+            for entry in sorted(entries, key=lambda x: (x["coefficient"], x["date"]))
+        ]
 
-    async def is_similar_notification_recently_sent(self, message_id):
-        """Проверяет, было ли похожее уведомление отправлено недавно."""
-        return await self.redis_client.is_notification_sent(message_id)
+    async def build_notifications(self, user_id, entries):
+        """
+        Готовит уведомления пользователю по всем подходящим слотам за тик.
 
-    async def mark_notification_as_sent(self, message_id):
-        """Помечает уведомление как отправленное с установленным временем жизни."""
-        await self.redis_client.mark_notification_as_sent(message_id, self.notification_delay)
+        В режиме агрегации все слоты собираются в одну сводку (с разбиением по лимиту Telegram),
+        иначе на каждый слот формируется отдельное сообщение.
+        """
+        logger.debug(f"Найдено слотов для уведомления пользователя {user_id}: {len(entries)}")
 
-    def generate_message_id(self, user_id, message):
-        """Генерирует уникальный идентификатор сообщения на основе пользователя и содержимого сообщения."""
-        result_string = f"{user_id}:{message}"
-        return hashlib.sha256(result_string.encode()).hexdigest()
+        alert_fields = [await self.get_alert_fields(entry) for entry in entries]
+        if self.aggregate:
+            messages = self.build_digest([texts.digest_item_text.format(**fields) for fields in alert_fields])
+        else:
+            messages = [texts.alert_text.format(**fields) for fields in alert_fields]
+
+        reply_markup = keyboards.go_booking().to_python()
+        return [(user_id, message, reply_markup) for message in messages]
+
+    async def get_alert_fields(self, entry):
+        """Возвращает значения для шаблона уведомления о слоте."""
+        box_type_ids = self.safe_split(entry.get("boxTypeID", ""))
+        box_type_names = self.get_box_type_names(box_type_ids)
+
+        coefficient = entry["coefficient"]
+        return {
+            "date": self.format_date(entry.get("date")),
+            "warehouseName": await self.redis_client.get_warehouse_name(entry["warehouseID"]),
+            "boxTypeName": ", ".join(box_type_names) if box_type_names else "Неизвестный тип",
+            "coefficient": f"{coefficient}" if int(coefficient) != 0 else "0",
+        }
+
+    def build_digest(self, items):
+        """Собирает слоты в сводные сообщения, не превышающие лимит длины сообщения Telegram."""
+        header_reserve = len(texts.digest_header_text.format(count=len(items), part="")) + 16
+        parts = [[]]
+        length = 0
+        for item in items:
+            if parts[-1] and length + len(item) + 1 > TELEGRAM_MESSAGE_LIMIT - header_reserve:
+                parts.append([])
+                length = 0
+            parts[-1].append(item)
+            length += len(item) + 1
+
+        messages = []
+        for number, part in enumerate(parts, start=1):
+            part_text = f" <i>({number}/{len(parts)})</i>" if len(parts) > 1 else ""
+            header = texts.digest_header_text.format(count=len(items), part=part_text)
+            messages.append(header + "\n".join(part))
+        return messages
+
+    def slot_fields(self, entry):
+        """Возвращает параметры слота для бинарных ключей: склад, тип коробки, день и коэффициент в сотых."""
+        (warehouse_id, box_type_id, slot_date), coefficient = self.snapshot_diff.slot_key(entry)
+        slot_day = date.fromisoformat(slot_date[:10]).toordinal()
+        return warehouse_id, box_type_id, slot_day, round(coefficient * 100)
+
+    def generate_message_id(self, user_id, entry):
+        """Генерирует компактный бинарный ключ дедупликации по пользователю и параметрам слота."""
+        return DEDUP_KEY.pack(user_id, *self.slot_fields(entry))
+
+    def slot_state(self, entry):
+        """Возвращает ключ слота в истории уведомлений запроса и коэффициент в сотых."""
+        warehouse_id, box_type_id, slot_day, coefficient = self.slot_fields(entry)
+        return SLOT_KEY.pack(warehouse_id, box_type_id, slot_day), coefficient
 
     def get_box_type_names(self, box_type_ids):
         """Возвращает список названий типов коробок по их идентификаторам."""
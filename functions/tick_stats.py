@@ -0,0 +1,86 @@
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from loguru import logger
+
+from utils.metrics import TICK_DURATION, TICK_STAGE_DURATION, TICK_OVERRUNS, TICK_SKIPPED, TICK_CARRIED
+
+TICK_STAGES = ("load", "fetch", "match", "dedup", "enqueue")
+
+
+class TickStats:
+    """Статистика тиков мониторинга: время стадий, дедлайн тика, переполнения и пропуски."""
+
+    def __init__(self, deadline_ratio=0.8, report_every=60):
+        self.deadline_ratio = deadline_ratio  # Доля периода тика, после которой опрос складов переносится
+        self.report_every = report_every  # Раз во сколько тиков писать сводку в лог
+        self.last = {}  # стадия -> длительность в последнем тике, сек.
+        self.total = Counter()  # стадия -> суммарная длительность, сек.
+        self.ticks = 0
+        self.overruns = 0  # Тики, не уложившиеся в период
+        self.skipped = 0  # Запуски, пропущенные планировщиком из-за незавершенного тика
+        self.carried = 0  # Складов, опрос которых перенесен на следующий тик из-за дедлайна
+        self.interval = 0.0
+        self.started = 0.0
+        self.deadline = 0.0
+        self.last_duration = 0.0
+
+    def start(self, interval):
+        """Начинает отсчет тика с заданным периодом."""
+        self.interval = interval
+        self.started = time.perf_counter()
+        self.deadline = self.started + interval * self.deadline_ratio
+        self.last = {}
+
+    @contextmanager
+    def stage(self, name):
+        """Замеряет длительность стадии тика."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.last[name] = self.last.get(name, 0.0) + elapsed
+            self.total[name] += elapsed
+            TICK_STAGE_DURATION.observe(elapsed, stage=name)
+
+    def expired(self):
+        """Проверяет, истек ли дедлайн текущего тика."""
+        return time.perf_counter() >= self.deadline
+
+    def remaining(self):
+        """Секунды до дедлайна текущего тика."""
+        return max(0.0, self.deadline - time.perf_counter())
+
+    def finish(self):
+        """Завершает тик: считает переполнения и периодически пишет сводку по стадиям."""
+        self.last_duration = time.perf_counter() - self.started
+        self.ticks += 1
+        TICK_DURATION.observe(self.last_duration)
+        stages = ", ".join(f"{name} {self.last.get(name, 0.0) * 1000:.0f} мс" for name in TICK_STAGES)
+
+        if self.last_duration > self.interval:
+            self.overruns += 1
+            TICK_OVERRUNS.inc()
+            logger.warning(f"Тик мониторинга длился {self.last_duration:.2f} сек. при периоде {self.interval:.1f} сек.: "
+                           f"{stages}")
+        else:
+            logger.debug(f"Тик мониторинга: {self.last_duration * 1000:.0f} мс ({stages})")
+
+        if self.report_every and self.ticks % self.report_every == 0:
+            logger.info(self.summary())
+
+    def skip(self):
+        self.skipped += 1
+        TICK_SKIPPED.inc()
+
+    def carry(self, warehouses):
+        self.carried += warehouses
+        TICK_CARRIED.inc(warehouses)
+
+    def summary(self):
+        """Сводка по тикам: среднее время стадий, переполнения, пропуски и переносы."""
+        averages = ", ".join(f"{name} {self.total[name] / max(self.ticks, 1) * 1000:.0f} мс" for name in TICK_STAGES)
+        return (f"Мониторинг: {self.ticks} тиков, среднее по стадиям: {averages}; "
+                f"переполнений {self.overruns}, пропусков {self.skipped}, переносов {self.carried}.")
@@ -1,47 +1,138 @@
 import aiohttp
 import asyncio
+import time
 from loguru import logger
+from functions.rate_limiter import KeyPool
+from utils.metrics import WB_API_LATENCY, WB_API_RESPONSES, WB_API_RATE_LIMITED
 
 
 class ApiClient:
-    def __init__(self, api_keys, max_retries=5, retry_delay=2, rate_limit=10):
+    def __init__(self, api_keys, max_retries=5, retry_delay=2, rate_limit=10, max_warehouses_per_request=100,
+                 connection_limit=20, dns_cache_ttl=300, keepalive_timeout=60, request_timeout=15,
+                 key_burst=6, key_refill_period=10, base_url="https://supplies-api.wildberries.ru"):
         self.api_keys = api_keys  # Список API ключей
+        self.base_url = base_url
         self.max_retries = max_retries
         self.retry_delay = retry_delay
         self.rate_limit = rate_limit
+        self.max_warehouses_per_request = max_warehouses_per_request  # Лимит ID складов в одном запросе
         self.semaphore = asyncio.Semaphore(rate_limit)
-        self.current_key_index = 0
+        # Лимиты WB на один аккаунт продавца: всплеск 6 запросов, далее 1 запрос в 10 секунд
+        self.key_pool = KeyPool(api_keys, capacity=key_burst, refill_period=key_refill_period)
+        self.connection_limit = connection_limit
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.request_timeout = request_timeout
+        self.session = None
 
-    def get_current_key(self):
-        """Получение текущего API ключа."""
-        return self.api_keys[self.current_key_index]
+    async def start(self):
+        """Создает долгоживущую сессию с пулом keep-alive соединений и кэшем DNS."""
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.connection_limit,
+                ttl_dns_cache=self.dns_cache_ttl,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.request_timeout),
+            )
+            logger.info("HTTP-сессия для WB API создана.")
+        return self.session
 
-    def switch_to_next_key(self):
-        """Переключение на следующий API ключ."""
-        self.current_key_index = (self.current_key_index + 1) % len(self.api_keys)
-        logger.info(f"Переключение на следующий API ключ: {self.get_current_key()[:5]}...")
+    async def close(self):
+        """Закрывает HTTP-сессию и все соединения пула."""
+        if self.session and not self.session.closed:
+            await self.session.close()
+            logger.info("HTTP-сессия для WB API закрыта.")
+        self.session = None
+
+    def get_retry_after(self, response):
+        """Определяет время cooldown ключа по заголовкам ответа 429."""
+        for header in ("X-Ratelimit-Retry", "Retry-After", "X-Ratelimit-Reset"):
+            value = response.headers.get(header)
+            if value:
+                try:
+                    return max(float(value), 1.0)
+                except ValueError:
+                    continue
+        return float(self.retry_delay)
 
     async def get_coefficient(self, warehouse_ids):
-        async with aiohttp.ClientSession() as session:
-            for attempt in range(self.max_retries):
-                async with self.semaphore:
-                    try:
-                        headers = {"Authorization": f"Bearer {self.get_current_key()}"}
-                        url = f"https://supplies-api.wildberries.ru/api/v1/acceptance/coefficients"
-                        async with session.get(url, params={"warehouse_ids": ",".join(warehouse_ids)}, headers=headers) as response:
-                            if response.status == 200:
-                                logger.info(f"Запрос к API успешен, попытка {attempt + 1}")
-                                return await response.json()
-                            elif response.status == 429:
-                                logger.warning(f"Превышен лимит запросов для ключа: {self.get_current_key()[:5]}..., переключение на другой ключ.")
-                                self.switch_to_next_key()
-                                await asyncio.sleep(self.retry_delay * (attempt + 1))  # Экспоненциальная задержка
-                            else:
-                                logger.error(f"Ошибка при запросе к API: {response.status}")
-                                await asyncio.sleep(self.retry_delay)
-                    except Exception as e:
-                        logger.error(f"Ошибка при выполнении запроса: {e}")
-                        await asyncio.sleep(self.retry_delay)
-
-            logger.error(f"Не удалось получить данные после {self.max_retries} попыток.")
-            return None
\ No newline at end of file
+        session = await self.start()
+        for attempt in range(self.max_retries):
+            api_key = await self.key_pool.acquire()
+            key_label = self.key_pool.label(api_key)
+            async with self.semaphore:
+                try:
+                    headers = {"Authorization": f"Bearer {api_key}"}
+                    url = f"{self.base_url}/api/v1/acceptance/coefficients"
+                    started = time.perf_counter()
+                    async with session.get(url, params={"warehouse_ids": ",".join(warehouse_ids)}, headers=headers) as response:
+                        WB_API_LATENCY.observe(time.perf_counter() - started, key=key_label)
+                        WB_API_RESPONSES.inc(key=key_label, status=response.status)
+                        remaining = response.headers.get("X-Ratelimit-Remaining")
+                        if remaining and remaining.isdigit():
+                            self.key_pool.sync_remaining(api_key, int(remaining))
+
+                        if response.status == 200:
+                            logger.info(f"Запрос к API успешен, попытка {attempt + 1}")
+                            return await response.json()
+                        elif response.status == 429:
+                            logger.warning(f"Превышен лимит запросов для ключа: {key_label}, переключение на другой ключ.")
+                            WB_API_RATE_LIMITED.inc(key=key_label)
+                            self.key_pool.cooldown(api_key, self.get_retry_after(response))
+                            continue
+                        else:
+                            logger.error(f"Ошибка при запросе к API: {response.status}")
+                except Exception as e:
+                    WB_API_RESPONSES.inc(key=key_label, status="error")
+                    logger.error(f"Ошибка при выполнении запроса: {e}")
+            await asyncio.sleep(self.retry_delay)
+
+        logger.error(f"Не удалось получить данные после {self.max_retries} попыток.")
+        return None
+
+    async def get_coefficients_snapshot(self, warehouse_ids, timeout=None):
+        """
+        Получает коэффициенты по всем складам минимальным числом запросов к API.
+
+        :param timeout: Сколько секунд ждать ответы; не успевшие части отменяются и в снимок не попадают
+        :return: Кортеж (снимок коэффициентов или None, множество успешно опрошенных складов)
+        """
+        unique_ids = sorted({str(warehouse_id) for warehouse_id in warehouse_ids})
+        if not unique_ids:
+            return [], set()
+
+        chunks = [
+            unique_ids[i:i + self.max_warehouses_per_request]
+            for i in range(0, len(unique_ids), self.max_warehouses_per_request)
+        ]
+        logger.debug(f"Запрос снимка коэффициентов: {len(unique_ids)} складов, {len(chunks)} запросов к API")
+
+        tasks = [asyncio.ensure_future(self.get_coefficient(chunk)) for chunk in chunks]
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+        snapshot = []
+        fetched_ids = set()
+        failed_chunks = 0
+        for chunk, task in zip(chunks, tasks):
+            if task in pending:
+                continue
+            result = task.result()
+            if result is None:
+                failed_chunks += 1
+                continue
+            snapshot.extend(result)
+            fetched_ids.update(int(warehouse_id) for warehouse_id in chunk)
+
+        if pending:
+            logger.warning(f"Не дождались {len(pending)} из {len(chunks)} частей снимка коэффициентов за {timeout:.1f} сек.")
+        elif failed_chunks == len(chunks):
+            return None, set()
+        if failed_chunks:
+            logger.warning(f"Не удалось получить {failed_chunks} из {len(chunks)} частей снимка коэффициентов.")
+        return snapshot, fetched_ids
@@ -2,7 +2,6 @@ from aiogram import types
 from aiogram.dispatcher import FSMContext
 from loguru import logger
 
-from database import postgre_base
 from data import texts
 from data.keyboards import warehouse_markup
 from handlers.subscription import process_subscribe
@@ -13,7 +12,7 @@ async def process_create_alert(query: types.CallbackQuery, state: FSMContext):
     await state.reset_state(with_data=True)
     await state.update_data(selected_warehouses=[])
 
-    is_subscribed = postgre_base.check_subscription(query.from_user.id)
+    is_subscribed = query.bot.get('subscription_cache').is_active(query.from_user.id)
 
     try:
         if is_subscribed:
@@ -5,7 +5,6 @@ from aiogram.utils.exceptions import ChatNotFound, UserDeactivated, BotKicked
 
 from loguru import logger
 from loader import config, dp
-from database.models import User
 from database import postgre_base, redis_base
 from data import keyboards, texts
 
@@ -18,16 +17,11 @@ async def send_welcome(message: types.Message, state: FSMContext):
     name = message.from_user.full_name
     username = message.from_user.username
 
-    try:
-        logger.debug(f"[{user_id}:{name}], in base info updated")
-        user = User.get(User.user_id == user_id)
-        if user.name != name or user.username != username:
-            user.name = name
-            user.username = username
-            user.save()
-    except User.DoesNotExist:
+    _, created = await postgre_base.save_user(user_id=user_id, name=name, username=username)
+    if created:
         logger.debug(f"[{user_id}:{name}], first time /start to bot")
-        await postgre_base.create_user(user_id=user_id, name=name, username=username)
+    else:
+        logger.debug(f"[{user_id}:{name}], in base info updated")
 
     if await check_chat_subscription(user_id, config.chat_id):
         await message.answer_sticker(texts.hi_sticker, reply_markup=keyboards.main_keyboard())
@@ -41,13 +35,11 @@ async def personal_area(query: types.CallbackQuery, state: FSMContext):
     await state.finish()
     user_id = query.from_user.id
 
-    user = User.get(User.user_id == user_id)
-
-    active_subscription = postgre_base.check_subscription(user)
+    active_until = query.bot.get('subscription_cache').get_end_date(user_id)
 
-    if active_subscription:
+    if active_until:
         subscribe_status = 'Подписка активирована'
-        end_date = active_subscription.end_date.strftime('%d.%m.%Y %H:%M')
+        end_date = active_until.strftime('%d.%m.%Y %H:%M')
         end_date_text = f"<b>└ Активна до:</b> <i>{end_date}</i>"
     else:
         subscribe_status = 'Подписка не активирована'
@@ -136,7 +136,7 @@ async def verify_payment_callback(query: types.CallbackQuery):
         if query.message.text:
             original_text = query.message.text
             if action == "confirm":
-                subscription = await postgre_base.grant_subscription(user_id, sub_days)
+                subscription = await query.bot.get('subscription_cache').grant(user_id, sub_days)
                 end_date = subscription.end_date.strftime('%d.%m.%Y %H:%M')
 
                 await bot.send_message(
@@ -151,7 +151,7 @@ async def verify_payment_callback(query: types.CallbackQuery):
             await query.message.edit_text(updated_text, reply_markup=None)
         else:
             if action == "confirm":
-                subscription = await postgre_base.grant_subscription(user_id, sub_days)
+                subscription = await query.bot.get('subscription_cache').grant(user_id, sub_days)
                 end_date = subscription.end_date.strftime('%d.%m.%Y %H:%M')
 
                 await bot.send_message(
@@ -6,10 +6,8 @@ from aiogram.utils.exceptions import MessageNotModified
 from loguru import logger
 from html import escape
 
-from loader import config, dp
+from loader import dp
 from data import texts, keyboards
-from database.redis_base import RedisClient
-from database import postgre_base
 
 from functions import executional
 from utils.datefunc import calculate_dates
@@ -17,11 +15,9 @@ from utils.datefunc import calculate_dates
 from handlers.subscription import process_subscription
 
 
-redis_client = RedisClient(redis_url=config.redis_url)
-
-
 async def handle_my_requests(query: types.CallbackQuery):
     await query.answer()
+    redis_client = query.bot.get('redis_client')
     user_requests = await redis_client.get_user_requests(query.from_user.id)
     if not user_requests:
         await query.message.edit_text(texts.active_request_text,
@@ -41,6 +37,7 @@ async def handle_request_details(query: types.CallbackQuery):
             await query.answer(texts.incorrect_request_text, show_alert=True)
             return
 
+        redis_client = query.bot.get('redis_client')
         user_requests = await redis_client.get_user_requests(query.from_user.id)
 
         if 0 <= request_index < len(user_requests):
@@ -49,7 +46,7 @@ async def handle_request_details(query: types.CallbackQuery):
             number = request_index + 1
 
             warehouse_ids = request.get('warehouse_ids', '').split(',')
-            warehouse_names = [await redis_client.get_warehouse_name(warehouse_id) for warehouse_id in warehouse_ids]
+            warehouse_names = await redis_client.get_warehouse_names(warehouse_ids)
 
             start_date = request.get('start_date')
             end_date = request.get('end_date')
@@ -73,7 +70,7 @@ async def handle_request_details(query: types.CallbackQuery):
                 coefficient=coefficient_text,  # Используем обработанный текст коэффициента
                 period=f'{start_date} - {end_date}',
                 notify_type='До первого совпадения' if request.get('notify_until_first', 'False').lower() == 'true'
-                else 'Без ограничений'
+                else get_policy_name(request.get('notify_policy'), request.get('notify_cooldown'))
             )
 
             await query.message.edit_text(details_message,
@@ -94,7 +91,7 @@ async def process_create_alert(query: types.CallbackQuery, state: FSMContext):
     await state.reset_state(with_data=True)
     await state.update_data(selected_warehouses=[])
 
-    is_subscribed = await postgre_base.check_subscription(query.from_user.id)
+    is_subscribed = query.bot.get('subscription_cache').is_active(query.from_user.id)
 
     try:
         if is_subscribed:
@@ -188,11 +185,23 @@ async def process_period_selection(query: types.CallbackQuery, state: FSMContext
                                   reply_markup=keyboards.notification_count_markup())
 
 
+def get_policy_name(notify_policy, notify_cooldown):
+    """Возвращает название политики повторных уведомлений для карточки запроса."""
+    for name, (policy, cooldown) in texts.notify_policy_map.values():
+        if policy == (notify_policy or "change") and (policy != "cooldown" or str(cooldown) == str(notify_cooldown)):
+            return name
+    return 'Без ограничений'
+
+
 async def process_create_notification(query: types.CallbackQuery, state: FSMContext):
     await query.answer()
     redis_client = query.bot.get('redis_client')
     notification_service = query.bot.get('notification_service')
     try:
+        if query.data == "notify_unlimited":
+            await query.message.edit_text(texts.select_policy_text, reply_markup=keyboards.notify_policy_markup())
+            return
+
         user_data = await state.get_data()
 
         warehouse_ids = user_data.get("selected_warehouses", [])
@@ -213,6 +222,8 @@ async def process_create_notification(query: types.CallbackQuery, state: FSMCont
         notification_type = 0 if query.data == "notify_once" else 1
 
         notify_until_first = notification_type == 0
+        _, (notify_policy, notify_cooldown) = texts.notify_policy_map.get(query.data.replace("policy_", "", 1),
+                                                                          texts.notify_policy_map["change"])
 
         selected_supply_types = user_data.get("selected_supply_types", [])
 
@@ -235,7 +246,9 @@ async def process_create_notification(query: types.CallbackQuery, state: FSMCont
             start_date=start_date,
             end_date=end_date,
             status_request=True,
-            notify_until_first=notify_until_first
+            notify_until_first=notify_until_first,
+            notify_policy=notify_policy,
+            notify_cooldown=notify_cooldown
         )
 
         coefficient_sign = "<" if coefficient_range.startswith('<') and coefficient_range != "0" else ""
@@ -286,6 +299,7 @@ def register_request_handlers(dp: Dispatcher):
     dp.register_callback_query_handler(process_coefficient_selection, lambda query: query.data.startswith("coefficient_"))
     dp.register_callback_query_handler(process_period_selection, lambda call: call.data.startswith("period_"))
     dp.register_callback_query_handler(process_create_notification, lambda call: call.data in ["notify_once",
-                                                                                               "notify_unlimited"])
+                                                                                               "notify_unlimited"]
+                                       or call.data.startswith("policy_"))
     dp.register_callback_query_handler(stop_search_callback_handler, lambda call: call.data.startswith("stop_search_"))
 
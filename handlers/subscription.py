@@ -4,7 +4,7 @@ from aiogram.dispatcher import FSMContext
 from loguru import logger
 
 from loader import config, dp
-from database import postgre_base, models
+from database import postgre_base
 from data import texts, keyboards, states
 
 
@@ -56,7 +56,7 @@ async def handle_subscription_duration(query: types.CallbackQuery, state: FSMCon
 
 async def check_payment_status(query: types.CallbackQuery):
     """Напоминает пользователю о необходимости предоставить квитанцию."""
-    user = models.User.get_or_none(models.User.user_id == query.from_user.id)
+    user = await postgre_base.get_user(query.from_user.id)
     if not user:
         await query.message.answer("Пользователь не найден.")
         return
@@ -113,7 +113,7 @@ async def verify_payment_callback(query: types.CallbackQuery):
     sub_days = int(sub_days_str)
 
     if action == "confirm":
-        subscription = await postgre_base.grant_subscription(user_id, sub_days)
+        subscription = await query.bot.get('subscription_cache').grant(user_id, sub_days)
         end_date = subscription.end_date.strftime('%d.%m.%Y %H:%M')
 
         await dp.bot.send_message(
@@ -9,6 +9,11 @@ class DatabaseConfig(BaseModel):
     user: str
     password: str
     host: str = "localhost"
+    port: int = 5432
+    pool_size: int = 8  # Потоков для запросов к Postgres
+    max_connections: int = 20  # Размер пула соединений (не меньше pool_size)
+    stale_timeout: int = 300  # Через сколько секунд простоя соединение в пуле закрывается
+    pool_timeout: int = 10  # Сколько секунд ждать свободное соединение из пула
 
 
 class Config(BaseModel):
@@ -23,9 +28,17 @@ class Config(BaseModel):
     chat_url: str
     support: str
     redis_url: str = ""
+    redis_durability: str = "server"  # server - полагаемся на AOF/RDB в конфиге Redis, debounced - BGSAVE не чаще snapshot_interval
+    redis_snapshot_interval: int = 300
+    request_archive_days: int = 30  # Через сколько дней удалять истекшие запросы из Redis (0 - хранить всегда)
     time_zone: str = "Europe/Moscow"
     skip_updates: bool = True
     notify: bool = True
+    metrics_host: str = "127.0.0.1"
+    metrics_port: int = 0  # Порт эндпоинта /metrics (0 - не поднимать)
+    notify_aggregate: bool = True  # Объединять все найденные слоты пользователя за тик в одно сообщение
+    poll_max_interval: int = 60  # Максимальный интервал опроса склада без изменений, сек.
+    notify_state_days: int = 7  # Сколько дней хранить последний отправленный коэффициент слота для режима «только при снижении»
 
     merchant_id: int
     first_secret: str
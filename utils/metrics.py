@@ -0,0 +1,171 @@
+"""
+Метрики процесса бота в текстовом формате Prometheus.
+
+Реестр самодостаточный (без prometheus_client), эндпоинт /metrics поднимается
+на aiohttp в том же цикле событий, что и бот.
+"""
+import time
+from contextlib import contextmanager
+
+from aiohttp import web
+from loguru import logger
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def format_labels(label_names, label_values, extra=None):
+    pairs = list(zip(label_names, label_values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.values = {}  # значения меток -> значение
+
+    def key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for label_values, value in self.values.items():
+            lines.append(f"{self.name}{format_labels(self.label_names, label_values)} {value}")
+        return lines
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value, **labels):
+        self.values[self.key(labels)] = value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        counts = self.values.get(key)
+        if counts is None:
+            # Счетчики по корзинам (без +Inf), сумма и общее число наблюдений
+            counts = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+        for position, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[0][position] += 1
+        counts[1] += value
+        counts[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for label_values, (bucket_counts, total, count) in self.values.items():
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                labels = format_labels(self.label_names, label_values, ("le", bound))
+                lines.append(f"{self.name}_bucket{labels} {bucket_count}")
+            lines.append(f"{self.name}_bucket{format_labels(self.label_names, label_values, ('le', '+Inf'))} {count}")
+            lines.append(f"{self.name}_sum{format_labels(self.label_names, label_values)} {total}")
+            lines.append(f"{self.name}_count{format_labels(self.label_names, label_values)} {count}")
+        return lines
+
+
+class Registry:
+    """Набор метрик и асинхронных сборщиков, которые обновляют gauge перед каждой выдачей."""
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name, documentation, labels=()):
+        return self.register(Gauge(name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def add_collector(self, collector):
+        """Добавляет асинхронную функцию, вызываемую перед выдачей метрик."""
+        self.collectors.append(collector)
+
+    async def collect(self):
+        for collector in self.collectors:
+            try:
+                await collector()
+            except Exception as e:
+                logger.error(f"Ошибка при сборе метрик: {e}")
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+TICK_DURATION = registry.histogram("notifier_tick_duration_seconds", "Длительность тика мониторинга")
+TICK_STAGE_DURATION = registry.histogram("notifier_tick_stage_duration_seconds",
+                                         "Длительность стадий тика мониторинга", labels=("stage",))
+TICK_OVERRUNS = registry.counter("notifier_tick_overruns_total", "Тики, не уложившиеся в период")
+TICK_SKIPPED = registry.counter("notifier_tick_skipped_total", "Тики, пропущенные планировщиком")
+TICK_CARRIED = registry.counter("notifier_tick_carried_warehouses_total", "Склады, опрос которых перенесен на следующий тик")
+
+WB_API_LATENCY = registry.histogram("wb_api_request_duration_seconds", "Длительность запросов к API WB", labels=("key",))
+WB_API_RESPONSES = registry.counter("wb_api_responses_total", "Ответы API WB по статусам", labels=("key", "status"))
+WB_API_RATE_LIMITED = registry.counter("wb_api_rate_limited_total", "Ответы 429 от API WB", labels=("key",))
+
+TELEGRAM_SENT = registry.counter("telegram_messages_sent_total", "Отправленные уведомления в Telegram")
+TELEGRAM_ERRORS = registry.counter("telegram_send_errors_total", "Ошибки отправки в Telegram", labels=("error",))
+
+NOTIFICATIONS_QUEUE_DEPTH = registry.gauge("notifications_queue_depth", "Уведомлений в очереди отправки")
+ACTIVE_REQUESTS = registry.gauge("active_requests", "Активные запросы в индексе подписок")
+REDIS_LATENCY = registry.histogram("redis_roundtrip_seconds", "Время обращения к Redis", labels=("operation",))
+
+
+async def metrics_handler(request):
+    await registry.collect()
+    return web.Response(body=registry.render().encode(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+
+async def start_metrics_server(host, port):
+    """Поднимает HTTP эндпоинт /metrics в текущем цикле событий."""
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Метрики доступны на http://{host}:{port}/metrics")
+    return runner